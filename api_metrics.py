@@ -0,0 +1,174 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from stack_waiter import THROTTLING_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+START_KEY = "api_metrics_start"
+OPERATION_KEY = "api_metrics_operation"
+
+
+class OperationStats:
+    """Counters and latency histogram of one service operation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttled_attempts = 0
+        self.errors = defaultdict(int)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def observe(self, latency):
+        self.calls += 1
+        self.latency_sum += latency
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+
+class ApiMetrics:
+    """Per service and operation API call statistics, collected through botocore event hooks.
+
+    attach() registers handlers on a client: before-call starts the clock,
+    after-call records latency (retries included), retry attempts and error
+    codes, and needs-retry counts each attempt answered with a throttling
+    error. export() writes everything in OpenMetrics text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(OperationStats)
+        self.started = time.monotonic()
+
+    def attach(self, client):
+        """Instrument every operation of a client."""
+        events = client.meta.events
+        service = client.meta.service_model.service_name
+        events.register('before-call', self._before_call, unique_id='api-metrics-before-call')
+        events.register('after-call', lambda **kwargs: self._after_call(service, **kwargs),
+                        unique_id='api-metrics-after-call')
+        events.register('after-call-error', lambda **kwargs: self._after_call_error(service, **kwargs),
+                        unique_id='api-metrics-after-call-error')
+        events.register('needs-retry', lambda **kwargs: self._needs_retry(service, **kwargs),
+                        unique_id='api-metrics-needs-retry')
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started = time.monotonic()
+
+    @staticmethod
+    def _before_call(model, context, **kwargs):
+        context[START_KEY] = time.monotonic()
+        context[OPERATION_KEY] = model.name
+
+    def _after_call(self, service, parsed, model, context, **kwargs):
+        latency = time.monotonic() - context.get(START_KEY, time.monotonic())
+        error_code = parsed.get('Error', {}).get('Code')
+        with self._lock:
+            stats = self._stats[(service, model.name)]
+            stats.observe(latency)
+            stats.retries += parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            if error_code:
+                stats.errors[error_code] += 1
+
+    def _after_call_error(self, service, exception, context, **kwargs):
+        # Raised instead of a response, e.g. a connection error
+        operation = context.get(OPERATION_KEY, 'unknown')
+        with self._lock:
+            stats = self._stats[(service, operation)]
+            stats.observe(time.monotonic() - context.get(START_KEY, time.monotonic()))
+            stats.errors[type(exception).__name__] += 1
+
+    def _needs_retry(self, service, response=None, operation=None, **kwargs):
+        if response is None or operation is None:
+            return None
+        if response[1].get('Error', {}).get('Code') in THROTTLING_ERRORS:
+            with self._lock:
+                self._stats[(service, operation.name)].throttled_attempts += 1
+        return None
+
+    def snapshot(self):
+        """Return {(service, operation): OperationStats} copies, sorted by key."""
+        with self._lock:
+            return {key: _copy(stats) for key, stats in sorted(self._stats.items())}
+
+    def log_summary(self):
+        """Log call counts and the time spent in API calls, busiest operations first."""
+        stats = self.snapshot()
+        if not stats:
+            return
+        elapsed = time.monotonic() - self.started
+        api_time = sum(s.latency_sum for s in stats.values())
+        logger.info(f"--- API calls ({sum(s.calls for s in stats.values())} calls, {api_time:.1f}s in API calls "
+                    f"summed over threads, {elapsed:.1f}s elapsed) ---")
+        for (service, operation), s in sorted(stats.items(), key=lambda item: item[1].calls, reverse=True):
+            logger.info(f"  {service}.{operation:<40} {s.calls:>6} calls {s.latency_sum / s.calls:7.3f}s avg "
+                        f"{s.retries:>5} retries {s.throttled_attempts:>5} throttled")
+
+    def export(self, path, run_name):
+        """Write the metrics as an OpenMetrics text file."""
+        stats = self.snapshot()
+        lines = []
+
+        def family(name, metric_type, help_text):
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"# HELP {name} {help_text}")
+
+        def labels(service, operation, **extra):
+            pairs = {"run": run_name, "service": service, "operation": operation, **extra}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+        family("aws_api_calls", "counter", "AWS API calls, by service and operation.")
+        for (service, operation), s in stats.items():
+            lines.append(f"aws_api_calls_total{labels(service, operation)} {s.calls}")
+
+        family("aws_api_retries", "counter", "Retried attempts of AWS API calls.")
+        for (service, operation), s in stats.items():
+            lines.append(f"aws_api_retries_total{labels(service, operation)} {s.retries}")
+
+        family("aws_api_throttled_attempts", "counter", "Attempts answered with a throttling error.")
+        for (service, operation), s in stats.items():
+            lines.append(f"aws_api_throttled_attempts_total{labels(service, operation)} {s.throttled_attempts}")
+
+        family("aws_api_errors", "counter", "AWS API calls that failed, by error code.")
+        for (service, operation), s in stats.items():
+            for code, count in sorted(s.errors.items()):
+                lines.append(f"aws_api_errors_total{labels(service, operation, code=code)} {count}")
+
+        family("aws_api_latency_seconds", "histogram", "AWS API call latency, retries included.")
+        for (service, operation), s in stats.items():
+            cumulative = 0
+            for bound, count in zip([float(b) for b in LATENCY_BUCKETS] + ["+Inf"], s.buckets):
+                cumulative += count
+                lines.append(f"aws_api_latency_seconds_bucket{labels(service, operation, le=bound)} {cumulative}")
+            lines.append(f"aws_api_latency_seconds_count{labels(service, operation)} {s.calls}")
+            lines.append(f"aws_api_latency_seconds_sum{labels(service, operation)} {s.latency_sum:.6f}")
+
+        family("run_duration_seconds", "gauge", "Wall-clock duration of the run.")
+        lines.append(f'run_duration_seconds{{run="{_escape(run_name)}"}} {time.monotonic() - self.started:.3f}')
+        lines.append("# EOF")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        logger.info(f"API metrics written to {path}")
+
+
+def _copy(stats):
+    copy = OperationStats()
+    copy.__dict__.update(stats.__dict__, errors=dict(stats.errors), buckets=list(stats.buckets))
+    return copy
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# --- Process-wide metrics ---
+api_metrics = ApiMetrics()
@@ -0,0 +1,66 @@
+import threading
+import boto3
+from botocore.config import Config
+from api_metrics import api_metrics
+
+# --- Constants ---
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+RETRY_MODE = "adaptive"
+MAX_ATTEMPTS = 10
+
+_lock = threading.Lock()
+_settings = {"region": None, "profile": None, "max_pool_connections": DEFAULT_MAX_POOL_CONNECTIONS}
+_sessions = {}
+_clients = {}
+
+
+def configure(region=None, profile=None, concurrency=None):
+    """Set the region, profile and connection pool size used for clients created from now on.
+
+    concurrency is the number of threads that may call AWS at the same time;
+    the connection pool is sized so none of them waits for a connection.
+    """
+    with _lock:
+        _settings["region"] = region
+        _settings["profile"] = profile
+        _settings["max_pool_connections"] = max(DEFAULT_MAX_POOL_CONNECTIONS, concurrency or 0)
+
+
+def client_config():
+    """Shared botocore config: adaptive retries (client-side rate limiting) and a pooled connection set."""
+    return Config(retries={"mode": RETRY_MODE, "total_max_attempts": MAX_ATTEMPTS},
+                  max_pool_connections=_settings["max_pool_connections"])
+
+
+def get_client(service_name, region=None, profile=None, endpoint_url=None):
+    """Return the client for a service, region and profile, creating it on first use.
+
+    Clients are cached and shared between threads and report to api_metrics;
+    region and profile default to the values passed to configure().
+    """
+    with _lock:
+        region = region or _settings["region"]
+        profile = profile or _settings["profile"]
+        key = (service_name, region, profile, endpoint_url)
+        if key not in _clients:
+            # boto3 sessions are not thread-safe, so clients are only created under the lock
+            if profile not in _sessions:
+                _sessions[profile] = boto3.session.Session(profile_name=profile)
+            _clients[key] = _sessions[profile].client(service_name, region_name=region, endpoint_url=endpoint_url,
+                                                      config=client_config())
+            api_metrics.attach(_clients[key])
+        return _clients[key]
+
+
+class LazyClient:
+    """Module-level stand-in for a client that is only created when first used."""
+
+    def __init__(self, service_name, **kwargs):
+        self._service_name = service_name
+        self._kwargs = kwargs
+        self._client = None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            self._client = get_client(self._service_name, **self._kwargs)
+        return getattr(self._client, name)
@@ -0,0 +1,304 @@
+"""Offline benchmarks of deployment.py and cleanup.py against simulated AWS APIs.
+
+Runs the landing zone (deploy, no-op redeploy, --only redeploy from an
+empty run state, drift sweep, cleanup, deploy/cleanup as one parent stack
+of nested stacks, and a redeploy that recovers a stack left in
+CREATE_FAILED) and synthetic N-tenant fan-outs against benchmarks/simulated_aws.py and reports simulated
+wall-clock time, API calls, retries and throttled calls per scenario.
+
+    python benchmarks/run_benchmarks.py --tenants 5 20 --throttle-rate 0.05
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import api_metrics
+import change_sets
+import cleanup
+import deployment
+import drift
+import rate_limit
+import stack_recovery
+import stack_waiter
+import upload_cert_to_acm
+from run_state import RunState
+from scheduler import DEFAULT_MAX_WORKERS, build_dependency_graph
+from stack_state import StackSnapshot
+from nested_stacks import parent_stack_name
+from stacks import DEFAULT_STACK_PREFIX, stack_definitions, tenant_stack_definitions
+from template_store import TemplateStore
+from tenants import tenant_dependency_graph
+from simulated_aws import DEFAULT_API_LATENCY, ScaledTime, SimulatedAws
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_SCALE = 0.01
+DEFAULT_TENANT_COUNTS = [2, 5]
+TEMPLATE_DIR = os.path.join(REPO_DIR, "templates")
+TEMPLATE_BUCKET = "simulated-templates"
+
+
+def instrumented(client):
+    """Report a simulated client's calls to api_metrics, as aws_clients does for real clients."""
+    api_metrics.api_metrics.attach(client)
+    return client
+
+
+def use_backend(sim, clock, stage_templates=False):
+    """Point deployment.py and cleanup.py at the simulated backend, with fresh stack state.
+
+    stage_templates stages templates in simulated S3, as --template-bucket does.
+    """
+    cf, ec2 = instrumented(sim.client('cloudformation')), instrumented(sim.client('ec2'))
+    deployment.cf, deployment.ec2 = cf, ec2
+    deployment.template_store = None
+    if stage_templates:
+        deployment.template_store = TemplateStore(instrumented(sim.client('s3')), TEMPLATE_BUCKET)
+    deployment.stack_snapshot = StackSnapshot(cf)
+    deployment.TEMPLATE_DIR = TEMPLATE_DIR
+    cleanup.cf = cf
+    cleanup.stack_snapshot = StackSnapshot(cf)
+    for module in (api_metrics, deployment, drift, stack_recovery, stack_waiter, change_sets, rate_limit):
+        module.time = clock
+    return cf, ec2
+
+
+def synthetic_tenants(count):
+    """Tenant manifest entries with unique prefixes and non-overlapping /16 VPCs."""
+    return [{"name": f"tenant-{i:03d}", "prefix": f"T{i:03d}", "cidr": f"10.{100 + i}.0.0/16"}
+            for i in range(1, count + 1)]
+
+
+def measure(name, sim, clock, run):
+    """Run one scenario and return its result row."""
+    sim.reset_counters()
+    started_real, started = time.monotonic(), clock.monotonic()
+    try:
+        success = bool(run())
+    except Exception as e:
+        logger.error(f"Scenario {name} raised: {e}")
+        success = False
+    return {
+        "scenario": name,
+        "success": success,
+        "simulated_seconds": round(clock.monotonic() - started, 1),
+        "real_seconds": round(time.monotonic() - started_real, 2),
+        "api_calls": sum(sim.calls.values()),
+        "retries": sum(sim.retries.values()),
+        "throttled": sum(sim.throttled.values()),
+        "calls_by_operation": dict(sorted(sim.calls.items())),
+        "retries_by_operation": dict(sorted(sim.retries.items())),
+    }
+
+
+def deploy_landing_zone(args, cache_dir):
+    if not deployment.preflight(stack_definitions, cache_dir, args.max_workers):
+        return False
+    definitions = deployment.nested_definitions(stack_definitions) if deployment.args.nested else stack_definitions
+    collected_outputs = {}
+    plans = deployment.plan_change_sets(definitions, args.max_workers) if deployment.args.change_sets else None
+    if not deployment.deploy_all(definitions, collected_outputs, max_workers=args.max_workers, plans=plans):
+        return False
+    return deployment.validate_gwlb_endpoint(deployment.gwlb_endpoints_by_vpc(collected_outputs), args.max_workers)
+
+
+def deploy_only(args, only, state_dir):
+    """Deploy only some stacks with an empty run state, as a fresh CI checkout does with --only."""
+    run_state = RunState(os.path.join(state_dir, "run-state.json"))
+    selected = deployment.select_stacks(build_dependency_graph(stack_definitions), only)
+    collected_outputs = deployment.upstream_outputs(stack_definitions, build_dependency_graph(stack_definitions),
+                                                    selected, run_state)
+    if collected_outputs is None or not deployment.deploy_all(stack_definitions, collected_outputs,
+                                                              max_workers=args.max_workers, only=selected,
+                                                              run_state=run_state):
+        return False
+    collected_outputs = {**deployment.skipped_outputs(stack_definitions, selected, run_state), **collected_outputs}
+    return deployment.validate_gwlb_endpoint(deployment.gwlb_endpoints_by_vpc(collected_outputs), args.max_workers)
+
+
+def deploy_tenant_fleet(args, cf, ec2, tenants, cache_dir):
+    if not deployment.preflight(stack_definitions, cache_dir, args.max_workers):
+        return False
+    rate_limit.attach_rate_limiter(cf, rate_limit.TokenBucket(args.api_rate, args.api_burst))
+    rate_limit.attach_rate_limiter(ec2, rate_limit.TokenBucket(args.api_rate, args.api_burst))
+    results = deployment.deploy_tenants(tenants, args.max_tenants, args.max_workers)
+    endpoints_by_vpc = {}
+    for r in results:
+        endpoints_by_vpc.update(deployment.gwlb_endpoints_by_vpc(r["outputs"]))
+    return all(r["success"] for r in results) and deployment.validate_gwlb_endpoint(endpoints_by_vpc, args.max_workers)
+
+
+def detect_drift(args, definitions):
+    """Drift sweep over all stacks; succeeds when exactly the stacks matching --drifted are reported."""
+    drifted = deployment.check_drift([s["name"] for s in definitions], args.max_workers)
+    expected = {s["name"] for s in definitions if any(fnmatch.fnmatchcase(s["name"], p) for p in args.drifted)}
+    return drifted == expected
+
+
+def delete_tenant_fleet(args, tenants):
+    if deployment.args.nested:
+        return cleanup.delete_all([{"name": parent_stack_name(t["prefix"])} for t in tenants], args.max_workers)
+    definitions = [s for t in tenants for s in tenant_stack_definitions(t["prefix"], t.get("cidr"))]
+    return cleanup.delete_all(definitions, max_workers=args.max_workers, graph=tenant_dependency_graph(tenants))
+
+
+def ensure_certificate(sim, cert_dir):
+    os.makedirs(cert_dir, exist_ok=True)
+    cert_path, key_path = os.path.join(cert_dir, "alb.crt"), os.path.join(cert_dir, "alb.key")
+    return upload_cert_to_acm.ensure_certificate(cert_path, key_path, acm=instrumented(sim.client('acm')))
+
+
+def run_benchmarks(args):
+    clock = ScaledTime(args.scale)
+
+    def backend():
+        return SimulatedAws(clock, TEMPLATE_DIR, stack_delays=args.delay, api_latency=args.api_latency,
+                            throttle_rate=args.throttle_rate, fail_stacks=args.fail, seed=args.seed,
+                            drifted_stacks=args.drifted)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        sim = backend()
+        use_backend(sim, clock)
+        # Metrics are timed in simulated seconds from here on
+        api_metrics.api_metrics.reset()
+        deployment.args = deployment.parser.parse_args([])
+        results.append(measure("lz-deploy", sim, clock, lambda: deploy_landing_zone(args, os.path.join(work_dir, "lz"))))
+
+        use_backend(sim, clock)
+        deployment.args = deployment.parser.parse_args(["--change-sets"])
+        results.append(measure("lz-redeploy --change-sets", sim, clock,
+                               lambda: deploy_landing_zone(args, os.path.join(work_dir, "lz"))))
+
+        use_backend(sim, clock)
+        deployment.args = deployment.parser.parse_args(["--only", "LZalbStack"])
+        results.append(measure("lz-redeploy --only LZalbStack", sim, clock,
+                               lambda: deploy_only(args, ["LZalbStack"], os.path.join(work_dir, "only"))))
+        deployment.args = deployment.parser.parse_args([])
+
+        use_backend(sim, clock)
+        results.append(measure("lz-drift", sim, clock, lambda: detect_drift(args, stack_definitions)))
+
+        use_backend(sim, clock)
+        results.append(measure("lz-cleanup", sim, clock,
+                               lambda: cleanup.delete_all(stack_definitions, max_workers=args.max_workers)))
+
+        use_backend(sim, clock, stage_templates=True)
+        deployment.args = deployment.parser.parse_args(["--nested", "--template-bucket", TEMPLATE_BUCKET])
+        results.append(measure("lz-nested-deploy", sim, clock,
+                               lambda: deploy_landing_zone(args, os.path.join(work_dir, "lz"))))
+        use_backend(sim, clock)
+        results.append(measure("lz-nested-cleanup", sim, clock, lambda: cleanup.delete_all(
+            [{"name": parent_stack_name(DEFAULT_STACK_PREFIX)}], max_workers=args.max_workers)))
+
+        # A failed onboarding leaves the ALB stack in CREATE_FAILED; the redeploy recreates it
+        sim = backend()
+        sim.fail_stacks.append("LZalbStack")
+        use_backend(sim, clock)
+        deployment.args = deployment.parser.parse_args([])
+        deploy_landing_zone(args, os.path.join(work_dir, "recover"))
+        sim.fail_stacks.remove("LZalbStack")
+        use_backend(sim, clock)
+        results.append(measure("lz-recover CREATE_FAILED", sim, clock,
+                               lambda: deploy_landing_zone(args, os.path.join(work_dir, "recover"))))
+
+        results.append(measure("acm-certificate", sim, clock, lambda: ensure_certificate(sim, work_dir)))
+        results.append(measure("acm-certificate (repeat)", sim, clock, lambda: ensure_certificate(sim, work_dir)))
+        # A CI checkout has no local alb.crt; the certificate already in ACM is reused
+        results.append(measure("acm-certificate (fresh checkout)", sim, clock,
+                               lambda: ensure_certificate(sim, os.path.join(work_dir, "checkout"))))
+
+        deployment.args = deployment.parser.parse_args([])
+        for count in args.tenants:
+            tenants = synthetic_tenants(count)
+            sim = backend()
+            cf, ec2 = use_backend(sim, clock)
+            cache_dir = os.path.join(work_dir, f"tenants-{count}")
+            results.append(measure(f"tenants-{count}-deploy", sim, clock,
+                                   lambda: deploy_tenant_fleet(args, cf, ec2, tenants, cache_dir)))
+            definitions = [s for t in tenants for s in tenant_stack_definitions(t["prefix"], t.get("cidr"))]
+            use_backend(sim, clock)
+            results.append(measure(f"tenants-{count}-drift", sim, clock, lambda: detect_drift(args, definitions)))
+            use_backend(sim, clock)
+            results.append(measure(f"tenants-{count}-cleanup", sim, clock, lambda: delete_tenant_fleet(args, tenants)))
+
+            deployment.args = deployment.parser.parse_args(["--nested", "--template-bucket", TEMPLATE_BUCKET])
+            cf, ec2 = use_backend(sim, clock, stage_templates=True)
+            results.append(measure(f"tenants-{count}-nested-deploy", sim, clock,
+                                   lambda: deploy_tenant_fleet(args, cf, ec2, tenants, cache_dir)))
+            use_backend(sim, clock)
+            results.append(measure(f"tenants-{count}-nested-cleanup", sim, clock,
+                                   lambda: delete_tenant_fleet(args, tenants)))
+            deployment.args = deployment.parser.parse_args([])
+    return results
+
+
+def print_report(results):
+    print(f"{'scenario':<34} {'result':<7} {'sim time':>10} {'real time':>10} {'API calls':>10} {'retries':>8} {'throttled':>10}")
+    for r in results:
+        print(f"{r['scenario']:<34} {'OK' if r['success'] else 'FAILED':<7} {r['simulated_seconds']:>9.1f}s "
+              f"{r['real_seconds']:>9.2f}s {r['api_calls']:>10} {r['retries']:>8} {r['throttled']:>10}")
+
+    totals = Counter()
+    for r in results:
+        totals.update(r["calls_by_operation"])
+    print("\nAPI calls by operation (all scenarios):")
+    for operation, count in totals.most_common():
+        print(f"  {operation:<52} {count:>6}")
+
+
+def parse_delay(value):
+    name, _, seconds = value.partition("=")
+    if not name or not seconds:
+        raise argparse.ArgumentTypeError(f"expected TEMPLATE_OR_STACK=SECONDS, got {value!r}")
+    return name, float(seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=DEFAULT_SCALE,
+                        help='Real seconds per simulated second (0.01 runs a 10-minute deploy in about 6s).')
+    parser.add_argument('--tenants', type=int, nargs='*', default=DEFAULT_TENANT_COUNTS,
+                        help='Synthetic tenant manifest sizes to benchmark.')
+    parser.add_argument('--delay', type=parse_delay, action='append', default=[],
+                        metavar='TEMPLATE_OR_STACK=SECONDS', help='Override a simulated stack creation time.')
+    parser.add_argument('--api-latency', type=float, default=DEFAULT_API_LATENCY,
+                        help='Simulated seconds per API request.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Probability that any single API request is throttled.')
+    parser.add_argument('--fail', action='append', default=[], metavar='STACK_PATTERN',
+                        help='Make stacks matching this glob fail, e.g. "T003*" or "*albStack".')
+    parser.add_argument('--drifted', action='append', default=[], metavar='STACK_PATTERN',
+                        help='Report drift on stacks matching this glob, e.g. "*vpcStack".')
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument('--max-tenants', type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument('--api-rate', type=float, default=rate_limit.DEFAULT_API_RATE)
+    parser.add_argument('--api-burst', type=int, default=rate_limit.DEFAULT_API_BURST)
+    parser.add_argument('--seed', type=int, default=0, help='Seed for throttling decisions.')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Write per-operation API metrics of all scenarios as an OpenMetrics text file.')
+    parser.add_argument('--json', metavar='PATH', help='Also write the full results, per operation, as JSON.')
+    parser.add_argument('--verbose', action='store_true', help='Keep the pipeline INFO logging.')
+    args = parser.parse_args()
+    args.delay = dict(args.delay)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = run_benchmarks(args)
+    print_report(results)
+    if args.metrics_file:
+        api_metrics.api_metrics.export(args.metrics_file, "benchmarks")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,639 @@
+import fnmatch
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import boto3
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from botocore.awsrequest import AWSResponse
+from botocore import xform_name
+
+# --- Constants ---
+DEFAULT_REGION = "ap-southeast-1"
+ACCOUNT_ID = "123456789012"
+DEFAULT_STACK_DELAY = 60
+# Typical creation times in seconds, by template
+DEFAULT_STACK_DELAYS = {
+    "vpc.yaml": 150,
+    "waf.yaml": 45,
+    "vgw.yaml": 90,
+    "security-groups.yaml": 30,
+    "alb.yaml": 200,
+    "gwlb-endpoint.yaml": 120,
+    "sftp-endpoint.yaml": 110,
+    "s3-vpc-endpoint.yaml": 30,
+    "apigw-endpoint.yaml": 110,
+}
+# Updates and deletes take this fraction of the creation time
+UPDATE_FACTOR = 0.5
+DELETE_FACTOR = 0.6
+DEFAULT_API_LATENCY = 0.15
+CHANGE_SET_DELAY = 8
+DRIFT_DETECTION_DELAY = 20
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 20
+EVENTS_PAGE_SIZE = 100
+NO_CHANGES_REASON = "The submitted information didn't contain changes. Submit different information to create a change set."
+
+
+class ScaledTime:
+    """Stand-in for the time module that runs simulated seconds `scale` times faster.
+
+    Patched into the pipeline modules so their polling delays, timeouts and
+    rate limits are expressed in simulated seconds.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def sleep(self, seconds):
+        time.sleep(seconds * self.scale)
+
+    def monotonic(self):
+        return time.monotonic() / self.scale
+
+    def time(self):
+        return time.time()
+
+
+class ApiError(Exception):
+    """An error response of the simulated API."""
+
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def _section(body, name):
+    match = re.search(rf"^{name}:\n(.*?)(?=^\S|\Z)", body, re.S | re.M)
+    return match.group(1) if match else ""
+
+
+def parse_template(body):
+    """Return (parameters, resources, outputs) of a YAML template.
+
+    parameters maps a name to whether it has a default; resources is a list
+    of (logical ID, type); outputs is a list of output keys.
+    """
+    parameters = {}
+    for name, spec in re.findall(r"^  (\w+):\n((?:    .*\n?|\s*\n)*)", _section(body, "Parameters"), re.M):
+        parameters[name] = bool(re.search(r"^    Default:", spec, re.M))
+    resources = re.findall(r"^  (\w+):\n    Type: (\S+)", _section(body, "Resources"), re.M)
+    outputs = re.findall(r"^  (\w+):", _section(body, "Outputs"), re.M)
+    return parameters, resources, outputs
+
+
+def _evaluate(value, outputs):
+    """Evaluate the Fn::GetAtt/Fn::Join subset used by generated parent templates.
+
+    outputs maps a nested stack's logical ID to its output values.
+    """
+    if isinstance(value, dict) and "Fn::GetAtt" in value:
+        resource, attribute = value["Fn::GetAtt"]
+        return outputs[resource][attribute.split(".", 1)[1]]
+    if isinstance(value, dict) and "Fn::Join" in value:
+        delimiter, parts = value["Fn::Join"]
+        return delimiter.join(_evaluate(part, outputs) for part in parts)
+    return value
+
+
+def _references(value):
+    """Logical IDs referenced through Fn::GetAtt anywhere in value."""
+    if isinstance(value, dict):
+        if "Fn::GetAtt" in value:
+            return {value["Fn::GetAtt"][0]}
+        return set().union(*(_references(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_references(v) for v in value))
+    return set()
+
+
+def _exports(body, parameters):
+    """Export names of a YAML template's outputs, with ${Parameter} references substituted."""
+    names = re.findall(r'^    Export:\n      Name: !Sub "?([^"\n]+)"?', _section(body, "Outputs"), re.M)
+    return {re.sub(r"\$\{(\w+)\}", lambda m: parameters.get(m.group(1), m.group(0)), name) for name in names}
+
+
+def _physical_id(*parts, kind="sim"):
+    return f"{kind}-{hashlib.sha256('/'.join(parts).encode('utf-8')).hexdigest()[:17]}"
+
+
+def _output_value(stack_name, key):
+    """Deterministic, realistic-looking value for a stack output."""
+    if key.startswith("GWLBEId") or key.endswith("VpcEndpointId"):
+        return _physical_id(stack_name, key, kind="vpce")
+    if key == "VpcId":
+        return _physical_id(stack_name, key, kind="vpc")
+    if "Subnet" in key:
+        return _physical_id(stack_name, key, kind="subnet")
+    if "SecurityGroup" in key:
+        return _physical_id(stack_name, key, kind="sg")
+    if key.endswith("Arn"):
+        return f"arn:aws:sim:{DEFAULT_REGION}:{ACCOUNT_ID}:{stack_name}/{key}"
+    return _physical_id(stack_name, key)
+
+
+class SimulatedAws:
+    """In-memory CloudFormation, EC2, S3, STS and ACM backend for offline benchmarks.
+
+    client() returns real boto3 clients, so parameter validation, paginators
+    and event hooks work as usual; requests are answered at before-call
+    instead of being sent. Stack operations take a configurable number of
+    simulated seconds, any call can be throttled (and is then retried the
+    way botocore's standard retry mode would) and stacks whose name matches
+    one of fail_stacks fail half-way through their resources. Stacks
+    matching drifted_stacks report their first resource as modified.
+    Templates can be staged in a simulated S3 bucket, and JSON parent
+    templates of AWS::CloudFormation::Stack resources take as long as the
+    critical path of their nested stacks.
+    """
+
+    def __init__(self, clock, template_dir=None, stack_delays=None, api_latency=DEFAULT_API_LATENCY,
+                 throttle_rate=0.0, fail_stacks=(), max_attempts=MAX_ATTEMPTS, seed=0, drifted_stacks=()):
+        self.clock = clock
+        self.stack_delays = dict(DEFAULT_STACK_DELAYS, **(stack_delays or {}))
+        self.api_latency = api_latency
+        self.throttle_rate = throttle_rate
+        self.fail_stacks = list(fail_stacks)
+        self.drifted_stacks = list(drifted_stacks)
+        self.max_attempts = max_attempts
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+        # Template bodies by file name, so bodies and TemplateURLs map back to a template
+        self.templates = {}
+        if template_dir:
+            for name in sorted(os.listdir(template_dir)):
+                with open(os.path.join(template_dir, name), 'r') as f:
+                    self.templates[name] = f.read()
+        self._template_names = {body: name for name, body in self.templates.items()}
+
+        self.stacks = {}        # StackId -> stack
+        self.live = {}          # StackName -> StackId of the current stack
+        self.change_sets = {}
+        self.drift_detections = {}
+        self.endpoints = {}
+        self.certificates = {}
+        self.objects = {}
+
+        self.calls = Counter()
+        self.retries = Counter()
+        self.throttled = Counter()
+
+    # --- Clients and request handling ---
+
+    def client(self, service_name):
+        """Return a boto3 client whose requests are answered by this backend."""
+        client = boto3.client(service_name, region_name=DEFAULT_REGION,
+                              aws_access_key_id="simulated", aws_secret_access_key="simulated")
+        client.meta.events.register('before-parameter-build', self._capture_params)
+        client.meta.events.register_last('before-call', lambda **kwargs: self._answer(client, **kwargs))
+        return client
+
+    @staticmethod
+    def _capture_params(params, context, **kwargs):
+        context['simulated_params'] = dict(params)
+
+    def _answer(self, client, model, context, **kwargs):
+        service = client.meta.service_model.service_id.hyphenize()
+        operation = f"{service}.{model.name}"
+        handler = getattr(self, f"_{service.replace('-', '_')}_{xform_name(model.name)}", None)
+        if handler is None:
+            raise NotImplementedError(f"{operation} is not simulated")
+
+        with self._lock:
+            self.calls[operation] += 1
+        for attempt in range(self.max_attempts):
+            # Each attempt goes through before-send, so rate limiters see retries as well
+            client.meta.events.emit(f"before-send.{service}.{model.name}", request=None)
+            self.clock.sleep(self.api_latency)
+            with self._lock:
+                throttle = self._random.random() < self.throttle_rate
+                backoff = min(MAX_BACKOFF, self._random.random() * 2 ** attempt)
+            if not throttle:
+                break
+            if attempt + 1 < self.max_attempts:
+                with self._lock:
+                    self.retries[operation] += 1
+                self.clock.sleep(backoff)
+        else:
+            with self._lock:
+                self.throttled[operation] += 1
+            return self._response(400, {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, attempt)
+
+        try:
+            with self._lock:
+                return self._response(200, handler(**context.get('simulated_params', {})), attempt)
+        except ApiError as e:
+            return self._response(e.status, {"Error": {"Code": e.code, "Message": e.message}}, attempt)
+
+    @staticmethod
+    def _response(status, parsed, retries=0):
+        parsed.setdefault("ResponseMetadata", {"HTTPStatusCode": status, "RetryAttempts": retries})
+        return AWSResponse(None, status, {}, None), parsed
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.retries.clear()
+            self.throttled.clear()
+
+    # --- Templates and stacks ---
+
+    def _template(self, TemplateBody=None, TemplateURL=None):
+        """Return (template name, body) for a TemplateBody or TemplateURL argument."""
+        if TemplateURL:
+            name = TemplateURL.rsplit("/", 1)[-1]
+            for (_, key), body in self.objects.items():
+                if TemplateURL.endswith(f"/{key}"):
+                    return self._template_names.get(body, name), body
+            if name not in self.templates:
+                raise ApiError("ValidationError", f"Template {TemplateURL} could not be retrieved")
+            return name, self.templates[name]
+        if not TemplateBody:
+            raise ApiError("ValidationError", "Either TemplateBody or TemplateURL must be specified")
+        return self._template_names.get(TemplateBody, "inline"), TemplateBody
+
+    def _stack(self, stack_name, include_deleted=False):
+        stack = self.stacks.get(stack_name) or self.stacks.get(self.live.get(stack_name))
+        if stack and (include_deleted or self._status(stack) != "DELETE_COMPLETE"):
+            return stack
+        raise ApiError("ValidationError", f"Stack with id {stack_name} does not exist")
+
+    @staticmethod
+    def _visible_events(stack):
+        now = datetime.now(timezone.utc)
+        return [e for e in stack["events"] if e["Timestamp"] <= now]
+
+    def _status(self, stack):
+        for event in reversed(self._visible_events(stack)):
+            if event["PhysicalResourceId"] == stack["StackId"]:
+                return event["ResourceStatus"]
+        return None
+
+    def _delay(self, stack):
+        if "nested_delay" in stack and stack["StackName"] not in self.stack_delays:
+            return stack["nested_delay"]
+        return self.stack_delays.get(stack["StackName"], self.stack_delays.get(stack["template"], DEFAULT_STACK_DELAY))
+
+    def _fails(self, stack):
+        return any(fnmatch.fnmatchcase(stack["StackName"], pattern) for pattern in self.fail_stacks)
+
+    def _drifted(self, stack):
+        return any(fnmatch.fnmatchcase(stack["StackName"], pattern) for pattern in self.drifted_stacks)
+
+    def _start_operation(self, stack, action, token):
+        """Schedule the events of a stack operation over its simulated duration."""
+        factor = {"CREATE": 1, "UPDATE": UPDATE_FACTOR, "DELETE": DELETE_FACTOR}[action]
+        duration = self._delay(stack) * factor * self.clock.scale
+        resources = stack["resources"] if action != "DELETE" else list(reversed(stack["resources"]))
+        fail_at = len(resources) // 2 if action != "DELETE" and self._fails(stack) else None
+        start = datetime.now(timezone.utc)
+
+        def event(offset, logical_id, resource_type, physical_id, status, reason=None):
+            stack["events"].append({
+                "StackId": stack["StackId"], "EventId": f"{stack['StackName']}-{next(self._ids)}",
+                "StackName": stack["StackName"], "LogicalResourceId": logical_id,
+                "PhysicalResourceId": physical_id, "ResourceType": resource_type,
+                "Timestamp": start + timedelta(seconds=offset * duration), "ResourceStatus": status,
+                "ClientRequestToken": token, **({"ResourceStatusReason": reason} if reason else {}),
+            })
+
+        def stack_event(offset, status, reason=None):
+            event(offset, stack["StackName"], "AWS::CloudFormation::Stack", stack["StackId"], status, reason)
+
+        stack_event(0, f"{action}_IN_PROGRESS")
+        for i, (logical_id, resource_type) in enumerate(resources):
+            physical_id = _physical_id(stack["StackName"], logical_id)
+            offset = (i + 1) / (len(resources) + 1)
+            event(offset - 0.5 / (len(resources) + 1), logical_id, resource_type, physical_id, f"{action}_IN_PROGRESS")
+            if i == fail_at:
+                event(offset, logical_id, resource_type, physical_id, f"{action}_FAILED", "Simulated failure")
+                if action == "CREATE":
+                    stack_event(offset, "CREATE_FAILED", "The following resource(s) failed to create")
+                else:
+                    stack_event(offset, "UPDATE_ROLLBACK_IN_PROGRESS", "The following resource(s) failed to update")
+                    stack_event(1, "UPDATE_ROLLBACK_COMPLETE")
+                return
+            event(offset, logical_id, resource_type, physical_id, f"{action}_COMPLETE")
+        stack_event(1, f"{action}_COMPLETE")
+
+    def _check_exports(self, stack, exports):
+        """Export names are unique per account and region, as in CloudFormation."""
+        for other in self.stacks.values():
+            if other is stack or self._status(other) == "DELETE_COMPLETE":
+                continue
+            duplicates = exports & other.get("exports", set())
+            if duplicates:
+                raise ApiError("ValidationError", f"Export with name {sorted(duplicates)[0]} is already exported "
+                                                  f"by stack {other['StackName']}")
+
+    def _apply(self, stack, template_name, body, parameters):
+        parameters = {p["ParameterKey"]: p.get("ParameterValue", "") for p in parameters}
+        if body.lstrip().startswith("{"):
+            stack.update(template=template_name, body=body, parameters=parameters)
+            stack.pop("nested_delay", None)
+            self._apply_parent(stack, json.loads(body))
+            return
+        exports = _exports(body, parameters)
+        self._check_exports(stack, exports)
+        _, resources, outputs = parse_template(body)
+        stack.update(template=template_name, body=body, parameters=parameters, exports=exports, resources=resources,
+                     outputs={key: _output_value(stack["StackName"], key) for key in outputs})
+        stack.pop("nested_delay", None)
+        self._register_endpoints(stack["StackId"], stack["parameters"], stack["outputs"])
+
+    def _apply_parent(self, stack, template):
+        """Resolve the nested stacks of a parent template in dependency order."""
+        nested = template.get("Resources", {})
+        child_outputs, finished_at, exports = {}, {}, set()
+        pending = dict(nested)
+        while pending:
+            ready = [rid for rid, r in pending.items() if _references(r["Properties"]) <= set(child_outputs)]
+            if not ready:
+                raise ApiError("ValidationError", "Circular dependency between resources")
+            for rid in ready:
+                properties = pending.pop(rid)["Properties"]
+                template_name, body = self._template(TemplateURL=properties["TemplateURL"])
+                child_name = f"{stack['StackName']}-{rid}"
+                parameters = {k: _evaluate(v, child_outputs) for k, v in properties.get("Parameters", {}).items()}
+                exports |= _exports(body, parameters)
+                _, _, outputs = parse_template(body)
+                child_outputs[rid] = {key: _output_value(child_name, key) for key in outputs}
+                self._register_endpoints(stack["StackId"], parameters, child_outputs[rid])
+                delay = self.stack_delays.get(child_name, self.stack_delays.get(template_name, DEFAULT_STACK_DELAY))
+                start = max((finished_at[dep] for dep in _references(properties)), default=0)
+                finished_at[rid] = start + delay
+        self._check_exports(stack, exports)
+        stack.update(exports=exports, resources=[(rid, r["Type"]) for rid, r in nested.items()],
+                     outputs={k: _evaluate(o["Value"], child_outputs) for k, o in template.get("Outputs", {}).items()},
+                     nested_delay=max(finished_at.values(), default=0))
+
+    def _register_endpoints(self, stack_id, parameters, outputs):
+        for key, endpoint_id in outputs.items():
+            if key.startswith("GWLBEId"):
+                self.endpoints[endpoint_id] = {
+                    "VpcEndpointId": endpoint_id, "VpcEndpointType": "GatewayLoadBalancer",
+                    "VpcId": parameters.get("VpcId", ""),
+                    "ServiceName": parameters.get("ServiceName", ""),
+                    "SubnetIds": parameters.get("SubnetIds", "").split(","),
+                    "State": "available", "stack": stack_id,
+                }
+
+    # --- CloudFormation ---
+
+    def _cloudformation_validate_template(self, **kwargs):
+        _, body = self._template(**kwargs)
+        declared, _, _ = parse_template(body)
+        parameters = []
+        for name, has_default in declared.items():
+            parameters.append({"ParameterKey": name, **({"DefaultValue": ""} if has_default else {})})
+        return {"Parameters": parameters}
+
+    def _cloudformation_describe_stacks(self, StackName=None, NextToken=None):
+        if StackName:
+            stacks = [self._stack(StackName, include_deleted=StackName.startswith("arn:"))]
+        else:
+            stacks = [s for s in self.stacks.values() if self._status(s) != "DELETE_COMPLETE"]
+        described = []
+        for stack in stacks:
+            status = self._status(stack)
+            entry = {"StackId": stack["StackId"], "StackName": stack["StackName"], "StackStatus": status,
+                     "CreationTime": stack["events"][0]["Timestamp"],
+                     "Parameters": [{"ParameterKey": k, "ParameterValue": v} for k, v in stack["parameters"].items()]}
+            if status in ("CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE"):
+                entry["Outputs"] = [{"OutputKey": k, "OutputValue": v} for k, v in stack["outputs"].items()]
+            described.append(entry)
+        return {"Stacks": described}
+
+    def _cloudformation_create_stack(self, StackName, Parameters=(), ClientRequestToken=None,
+                                     TemplateBody=None, TemplateURL=None, **kwargs):
+        if StackName in self.live and self._status(self.stacks[self.live[StackName]]) != "DELETE_COMPLETE":
+            raise ApiError("AlreadyExistsException", f"Stack [{StackName}] already exists")
+        template_name, body = self._template(TemplateBody, TemplateURL)
+        stack_id = f"arn:aws:cloudformation:{DEFAULT_REGION}:{ACCOUNT_ID}:stack/{StackName}/{next(self._ids)}"
+        stack = {"StackId": stack_id, "StackName": StackName, "events": []}
+        self._apply(stack, template_name, body, Parameters)
+        self.stacks[stack_id] = stack
+        self.live[StackName] = stack_id
+        self._start_operation(stack, "CREATE", ClientRequestToken)
+        return {"StackId": stack_id}
+
+    def _check_updatable(self, stack):
+        status = self._status(stack)
+        if status not in ("CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE"):
+            raise ApiError("ValidationError", f"Stack:{stack['StackId']} is in {status} state and can not be updated.")
+
+    def _cloudformation_update_stack(self, StackName, Parameters=(), ClientRequestToken=None,
+                                     TemplateBody=None, TemplateURL=None, **kwargs):
+        stack = self._stack(StackName)
+        self._check_updatable(stack)
+        template_name, body = self._template(TemplateBody, TemplateURL)
+        if body == stack["body"] and {p["ParameterKey"]: p.get("ParameterValue", "") for p in Parameters} == stack["parameters"]:
+            raise ApiError("ValidationError", "No updates are to be performed.")
+        previous = {k: stack[k] for k in ("template", "body", "resources", "parameters", "outputs", "exports")}
+        self._apply(stack, template_name, body, Parameters)
+        self._start_operation(stack, "UPDATE", ClientRequestToken)
+        if self._fails(stack):
+            # The update rolls back to the previous template and parameters
+            stack.update(previous)
+        return {"StackId": stack["StackId"]}
+
+    def _cloudformation_delete_stack(self, StackName, ClientRequestToken=None, **kwargs):
+        try:
+            stack = self._stack(StackName)
+        except ApiError:
+            return {}
+        if self._status(stack).startswith("DELETE_"):
+            return {}
+        for endpoint_id in [e for e, ep in self.endpoints.items() if ep["stack"] == stack["StackId"]]:
+            del self.endpoints[endpoint_id]
+        self._start_operation(stack, "DELETE", ClientRequestToken)
+        return {}
+
+    def _cloudformation_describe_stack_events(self, StackName, NextToken=None):
+        stack = self._stack(StackName, include_deleted=True)
+        events = list(reversed(self._visible_events(stack)))
+        start = int(NextToken or 0)
+        response = {"StackEvents": events[start:start + EVENTS_PAGE_SIZE]}
+        if start + EVENTS_PAGE_SIZE < len(events):
+            response["NextToken"] = str(start + EVENTS_PAGE_SIZE)
+        return response
+
+    def _cloudformation_create_change_set(self, StackName, ChangeSetName, Parameters=(), TemplateBody=None,
+                                          TemplateURL=None, **kwargs):
+        stack = self._stack(StackName)
+        template_name, body = self._template(TemplateBody, TemplateURL)
+        change_set_id = f"arn:aws:cloudformation:{DEFAULT_REGION}:{ACCOUNT_ID}:changeSet/{ChangeSetName}/{next(self._ids)}"
+        unchanged = (body == stack["body"] and
+                     {p["ParameterKey"]: p.get("ParameterValue", "") for p in Parameters} == stack["parameters"])
+        self.change_sets[change_set_id] = {
+            "stack": stack["StackId"], "template": template_name, "body": body, "parameters": list(Parameters),
+            "ready_at": time.monotonic() + CHANGE_SET_DELAY * self.clock.scale, "empty": unchanged,
+        }
+        return {"Id": change_set_id, "StackId": stack["StackId"]}
+
+    def _change_set(self, change_set_id):
+        if change_set_id not in self.change_sets:
+            raise ApiError("ChangeSetNotFound", f"ChangeSet [{change_set_id}] does not exist", 404)
+        return self.change_sets[change_set_id]
+
+    def _cloudformation_describe_change_set(self, ChangeSetName, NextToken=None, **kwargs):
+        change_set = self._change_set(ChangeSetName)
+        response = {"ChangeSetId": ChangeSetName, "StackId": change_set["stack"]}
+        if time.monotonic() < change_set["ready_at"]:
+            return dict(response, Status="CREATE_IN_PROGRESS")
+        if change_set["empty"]:
+            return dict(response, Status="FAILED", StatusReason=NO_CHANGES_REASON)
+        _, resources, _ = parse_template(change_set["body"])
+        changes = [{"Type": "Resource", "ResourceChange": {"Action": "Modify", "LogicalResourceId": logical_id,
+                                                           "ResourceType": resource_type, "Replacement": "False"}}
+                   for logical_id, resource_type in resources]
+        return dict(response, Status="CREATE_COMPLETE", Changes=changes)
+
+    def _cloudformation_execute_change_set(self, ChangeSetName, ClientRequestToken=None, **kwargs):
+        change_set = self._change_set(ChangeSetName)
+        del self.change_sets[ChangeSetName]
+        stack = self.stacks[change_set["stack"]]
+        self._check_updatable(stack)
+        self._apply(stack, change_set["template"], change_set["body"], change_set["parameters"])
+        self._start_operation(stack, "UPDATE", ClientRequestToken)
+        return {}
+
+    def _cloudformation_delete_change_set(self, ChangeSetName, **kwargs):
+        self._change_set(ChangeSetName)
+        del self.change_sets[ChangeSetName]
+        return {}
+
+    def _cloudformation_detect_stack_drift(self, StackName, **kwargs):
+        stack = self._stack(StackName)
+        status = self._status(stack)
+        if status not in ("CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE"):
+            raise ApiError("ValidationError", f"Stack {StackName} is in {status} state and drift can not be detected.")
+        detection_id = f"drift-{next(self._ids)}"
+        self.drift_detections[detection_id] = {"stack": stack["StackId"],
+                                               "ready_at": self.clock.monotonic() + DRIFT_DETECTION_DELAY}
+        return {"StackDriftDetectionId": detection_id}
+
+    def _cloudformation_describe_stack_drift_detection_status(self, StackDriftDetectionId):
+        detection = self.drift_detections.get(StackDriftDetectionId)
+        if detection is None:
+            raise ApiError("ValidationError", f"Drift detection {StackDriftDetectionId} does not exist")
+        stack = self.stacks[detection["stack"]]
+        response = {"StackId": stack["StackId"], "StackDriftDetectionId": StackDriftDetectionId,
+                    "Timestamp": datetime.now(timezone.utc)}
+        if self.clock.monotonic() < detection["ready_at"]:
+            return dict(response, DetectionStatus="DETECTION_IN_PROGRESS")
+        drifted = self._drifted(stack) and bool(stack["resources"])
+        return dict(response, DetectionStatus="DETECTION_COMPLETE",
+                    StackDriftStatus="DRIFTED" if drifted else "IN_SYNC", DriftedStackResourceCount=int(drifted))
+
+    def _cloudformation_describe_stack_resource_drifts(self, StackName, StackResourceDriftStatusFilters=(),
+                                                       NextToken=None, **kwargs):
+        stack = self._stack(StackName)
+        drifts = []
+        for i, (logical_id, resource_type) in enumerate(stack["resources"]):
+            status = "MODIFIED" if i == 0 and self._drifted(stack) else "IN_SYNC"
+            if StackResourceDriftStatusFilters and status not in StackResourceDriftStatusFilters:
+                continue
+            drifts.append({
+                "StackId": stack["StackId"], "LogicalResourceId": logical_id, "ResourceType": resource_type,
+                "PhysicalResourceId": _physical_id(stack["StackName"], logical_id),
+                "StackResourceDriftStatus": status, "Timestamp": datetime.now(timezone.utc),
+                "PropertyDifferences": [{"PropertyPath": "/Tags", "ExpectedValue": "[]", "ActualValue": "[{}]",
+                                         "DifferenceType": "NOT_EQUAL"}] if status == "MODIFIED" else [],
+            })
+        return {"StackResourceDrifts": drifts}
+
+    # --- EC2 ---
+
+    def _ec2_modify_vpc_attribute(self, VpcId, **kwargs):
+        return {}
+
+    def _ec2_describe_vpc_endpoints(self, VpcEndpointIds=None, Filters=(), **kwargs):
+        endpoints = list(self.endpoints.values())
+        if VpcEndpointIds:
+            missing = [e for e in VpcEndpointIds if e not in self.endpoints]
+            if missing:
+                raise ApiError("InvalidVpcEndpointId.NotFound", f"The Vpc Endpoint Id '{missing[0]}' does not exist")
+            endpoints = [self.endpoints[e] for e in VpcEndpointIds]
+        for f in Filters:
+            field = {"vpc-id": "VpcId", "vpc-endpoint-type": "VpcEndpointType"}.get(f["Name"])
+            if field:
+                endpoints = [ep for ep in endpoints if ep[field] in f["Values"]]
+        return {"VpcEndpoints": [{k: v for k, v in ep.items() if k != "stack"} for ep in endpoints]}
+
+    def _ec2_describe_vpc_endpoint_services(self, ServiceNames=(), **kwargs):
+        return {"ServiceDetails": [{
+            "ServiceName": name, "ServiceId": name.split(".")[-1], "Owner": ACCOUNT_ID,
+            "AcceptanceRequired": False, "ServiceType": [{"ServiceType": "GatewayLoadBalancer"}],
+        } for name in ServiceNames]}
+
+    # --- S3 ---
+
+    def _s3_head_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise ApiError("404", "Not Found", status=404)
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def _s3_put_object(self, Bucket, Key, Body=b"", **kwargs):
+        body = Body.read() if hasattr(Body, "read") else Body
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        self.objects[(Bucket, Key)] = body.decode("utf-8")
+        return {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+
+    # --- STS ---
+
+    def _sts_get_caller_identity(self, **kwargs):
+        return {"Account": ACCOUNT_ID, "Arn": f"arn:aws:iam::{ACCOUNT_ID}:user/simulated", "UserId": "SIMULATED"}
+
+    # --- ACM ---
+
+    def _acm_import_certificate(self, Certificate, PrivateKey, CertificateArn=None, Tags=(), **kwargs):
+        arn = CertificateArn or f"arn:aws:acm:{DEFAULT_REGION}:{ACCOUNT_ID}:certificate/{next(self._ids)}"
+        if CertificateArn and CertificateArn not in self.certificates:
+            raise ApiError("ResourceNotFoundException", f"Certificate {CertificateArn} not found")
+        if CertificateArn and Tags:
+            raise ApiError("ValidationException", "Tags cannot be applied when reimporting a certificate")
+        cert = x509.load_pem_x509_certificate(Certificate)
+        previous = self.certificates.get(arn, {})
+        self.certificates[arn] = {
+            "CertificateArn": arn, "Type": "IMPORTED",
+            "DomainName": cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)[0].value,
+            "NotAfter": cert.not_valid_after_utc,
+            "KeyAlgorithm": "EC_prime256v1" if isinstance(cert.public_key(), ec.EllipticCurvePublicKey) else "RSA_2048",
+            "Tags": {**previous.get("Tags", {}), **{t["Key"]: t.get("Value", "") for t in Tags}},
+        }
+        return {"CertificateArn": arn}
+
+    def _acm_list_certificates(self, NextToken=None, **kwargs):
+        return {"CertificateSummaryList": [{k: v for k, v in c.items() if k != "Tags"}
+                                           for c in self.certificates.values()]}
+
+    def _acm_describe_certificate(self, CertificateArn):
+        if CertificateArn not in self.certificates:
+            raise ApiError("ResourceNotFoundException", f"Certificate {CertificateArn} not found")
+        return {"Certificate": {**{k: v for k, v in self.certificates[CertificateArn].items() if k != "Tags"},
+                                "Status": "ISSUED"}}
+
+    def _acm_list_tags_for_certificate(self, CertificateArn):
+        if CertificateArn not in self.certificates:
+            raise ApiError("ResourceNotFoundException", f"Certificate {CertificateArn} not found")
+        return {"Tags": [{"Key": k, "Value": v} for k, v in self.certificates[CertificateArn]["Tags"].items()]}
+
+    def _acm_add_tags_to_certificate(self, CertificateArn, Tags):
+        if CertificateArn not in self.certificates:
+            raise ApiError("ResourceNotFoundException", f"Certificate {CertificateArn} not found")
+        self.certificates[CertificateArn]["Tags"].update({t["Key"]: t.get("Value", "") for t in Tags})
+        return {}
@@ -0,0 +1,101 @@
+import logging
+import time
+from botocore.exceptions import ClientError
+from deploy_cache import stack_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+CHANGE_SET_PREFIX = "lz-update"
+EMPTY_CHANGE_SET_REASONS = ("didn't contain changes", "No updates are to be performed")
+POLL_DELAY = 3
+DEFAULT_TIMEOUT = 900
+PENDING_STATUSES = ("CREATE_PENDING", "CREATE_IN_PROGRESS")
+
+
+def create_change_set(cf, stack_name, template_source, parameters):
+    """Create an update change set for a stack and return its ARN.
+
+    template_source is either {"TemplateBody": ...} or {"TemplateURL": ...}.
+    """
+    response = cf.create_change_set(
+        StackName=stack_name,
+        ChangeSetName=f"{CHANGE_SET_PREFIX}-{int(time.time() * 1000)}",
+        ChangeSetType='UPDATE',
+        **template_source,
+        Parameters=parameters,
+        Capabilities=['CAPABILITY_NAMED_IAM']
+    )
+    return response['Id']
+
+
+def wait_for_change_set(cf, change_set_id, timeout=DEFAULT_TIMEOUT):
+    """Wait until a change set is ready and return (changes, is_empty).
+
+    Raises RuntimeError if the change set fails, ends up in any other status
+    (e.g. deleted by someone else) or is not ready within timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = cf.describe_change_set(ChangeSetName=change_set_id)
+        status = response['Status']
+        if status == 'CREATE_COMPLETE':
+            changes = list(response.get('Changes', []))
+            while response.get('NextToken'):
+                response = cf.describe_change_set(ChangeSetName=change_set_id, NextToken=response['NextToken'])
+                changes.extend(response.get('Changes', []))
+            return changes, not changes
+        if status == 'FAILED':
+            reason = response.get('StatusReason', '')
+            if any(r in reason for r in EMPTY_CHANGE_SET_REASONS):
+                return [], True
+            raise RuntimeError(f"Change set {change_set_id} failed: {reason}")
+        if status not in PENDING_STATUSES:
+            raise RuntimeError(f"Change set {change_set_id} is in unexpected status {status}")
+        time.sleep(POLL_DELAY)
+    raise RuntimeError(f"Timed out after {timeout}s waiting for change set {change_set_id}")
+
+
+def delete_change_set(cf, change_set_id):
+    """Delete a change set, ignoring one that is already gone."""
+    try:
+        cf.delete_change_set(ChangeSetName=change_set_id)
+    except ClientError as e:
+        # Executed change sets are removed by CloudFormation itself
+        if e.response['Error']['Code'] == 'ChangeSetNotFound':
+            return
+        logger.warning(f"Failed to delete change set {change_set_id}: {e}")
+
+
+def format_change_set_diff(stack_name, changes):
+    """Render resource changes as one compact Add/Modify/Replace line each."""
+    lines = [f"Change set for {stack_name}: {len(changes)} change(s)"]
+    for change in changes:
+        rc = change.get('ResourceChange', {})
+        action = rc.get('Action', '?')
+        if action == 'Modify' and rc.get('Replacement') in ('True', 'Conditional'):
+            action = 'Replace' if rc['Replacement'] == 'True' else 'Replace?'
+        lines.append(f"  {action:<9} {rc.get('ResourceType', ''):<40} {rc.get('LogicalResourceId', '')}")
+    return "\n".join(lines)
+
+
+def prepare_change_set(cf, stack_name, template_body, parameters, template_source=None):
+    """Create and inspect a change set, discarding it if it is empty.
+
+    Returns a plan dict with the change set ARN (None when empty) and the
+    fingerprint of the template and parameters it was built from.
+    """
+    fingerprint = stack_fingerprint(template_body, parameters)
+    change_set_id = create_change_set(cf, stack_name, template_source or {"TemplateBody": template_body}, parameters)
+    try:
+        changes, empty = wait_for_change_set(cf, change_set_id)
+    except RuntimeError:
+        delete_change_set(cf, change_set_id)
+        raise
+    if empty:
+        delete_change_set(cf, change_set_id)
+        logger.info(f"No changes for stack {stack_name}; discarded empty change set.")
+        return {"change_set_id": None, "fingerprint": fingerprint}
+
+    logger.info(format_change_set_diff(stack_name, changes))
+    return {"change_set_id": change_set_id, "fingerprint": fingerprint}
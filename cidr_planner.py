@@ -0,0 +1,198 @@
+import argparse
+import bisect
+import ipaddress
+import json
+import logging
+import sys
+from aws_clients import configure, get_client
+from stacks import (MAX_SUBNET_PREFIX_LENGTH, SUBNET_CIDR_PARAMETERS, SUBNET_PREFIX_OFFSET, stack_definitions,
+                    subnet_cidrs)
+
+# --- Logging setup ---
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_POOL = "10.0.0.0/8"
+DEFAULT_VPC_PREFIX_LENGTH = 16
+# The subnet layout needs 19 blocks 8 bits smaller than the VPC, and ALB subnets can be no smaller than /27
+MIN_VPC_PREFIX_LENGTH = 16
+MAX_VPC_PREFIX_LENGTH = MAX_SUBNET_PREFIX_LENGTH - SUBNET_PREFIX_OFFSET
+DEFAULT_AZ_COUNT = 3
+
+
+class CidrIndex:
+    """Sorted, merged address intervals of every CIDR that is taken.
+
+    Lookups and inserts are binary searches, so planning hundreds of tenants
+    against hundreds of existing VPCs stays fast.
+    """
+
+    def __init__(self, networks=()):
+        self._starts = []
+        self._ends = []
+        for network in networks:
+            self.add(network)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlaps(self, network):
+        """Return True if any part of network is taken."""
+        network = ipaddress.ip_network(network)
+        start, end = int(network.network_address), int(network.broadcast_address)
+        i = bisect.bisect_right(self._starts, end)
+        return i > 0 and self._ends[i - 1] >= start
+
+    def add(self, network):
+        """Mark network as taken, merging it with the intervals it overlaps or touches."""
+        network = ipaddress.ip_network(network)
+        start, end = int(network.network_address), int(network.broadcast_address)
+        lo = bisect.bisect_left(self._ends, start - 1)
+        hi = bisect.bisect_right(self._starts, end + 1)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def allocate(self, pool, prefix_length):
+        """Take and return the lowest free network of prefix_length inside pool, or None if pool is full."""
+        pool = ipaddress.ip_network(pool)
+        size = 2 ** (pool.max_prefixlen - prefix_length)
+        candidate, last = int(pool.network_address), int(pool.broadcast_address)
+        while candidate + size - 1 <= last:
+            i = bisect.bisect_right(self._starts, candidate + size - 1)
+            if i > 0 and self._ends[i - 1] >= candidate:
+                # Skip past the taken interval, to the next aligned block
+                candidate = (self._ends[i - 1] // size + 1) * size
+                continue
+            network = ipaddress.ip_network((candidate, prefix_length))
+            self.add(network)
+            return network
+        return None
+
+
+def existing_vpc_cidrs(ec2):
+    """Return every IPv4 CIDR associated with a VPC in the account and region."""
+    cidrs = []
+    for page in ec2.get_paginator('describe_vpcs').paginate():
+        for vpc in page.get("Vpcs", []):
+            associations = vpc.get("CidrBlockAssociationSet") or [{"CidrBlock": vpc["CidrBlock"]}]
+            for association in associations:
+                state = association.get("CidrBlockState", {}).get("State", "associated")
+                if state in ("associating", "associated"):
+                    cidrs.append(association["CidrBlock"])
+    return cidrs
+
+
+def landing_zone_cidrs():
+    """VPC CIDRs the default landing zone stacks use."""
+    return [p["ParameterValue"] for s in stack_definitions for p in s.get("parameters", [])
+            if p["ParameterKey"] == "VpcCidr"]
+
+
+def overlapping_tenants(tenants):
+    """Return (tenant, tenant) name pairs whose planned VPC CIDRs overlap."""
+    planned = sorted((ipaddress.ip_network(t["cidr"]), t["name"]) for t in tenants if t.get("cidr"))
+    overlaps = []
+    for i, (network, name) in enumerate(planned):
+        for other, other_name in planned[i + 1:]:
+            if other.network_address > network.broadcast_address:
+                break
+            overlaps.append((name, other_name))
+    return overlaps
+
+
+def check_tenant_cidr(tenant):
+    """Raise ValueError if a tenant's VPC CIDR is outside /16-/19."""
+    length = ipaddress.ip_network(tenant["cidr"]).prefixlen
+    if not MIN_VPC_PREFIX_LENGTH <= length <= MAX_VPC_PREFIX_LENGTH:
+        raise ValueError(f"Tenant {tenant['name']} CIDR {tenant['cidr']} must be between "
+                         f"/{MIN_VPC_PREFIX_LENGTH} and /{MAX_VPC_PREFIX_LENGTH}")
+
+
+def plan_tenant_cidrs(tenants, taken=(), pool=DEFAULT_POOL, prefix_length=DEFAULT_VPC_PREFIX_LENGTH,
+                      az_count=DEFAULT_AZ_COUNT):
+    """Allocate a VPC CIDR to every tenant that has none and carve out its subnets.
+
+    Tenants that already have a cidr keep it. They may already be deployed,
+    so they are only checked against each other, not against taken. New
+    ranges avoid taken (existing VPCs, the landing zone) and every planned
+    tenant. Returns {tenant name: {"cidr", "subnets", "allocated"}}; raises
+    ValueError on VPC ranges outside /16-/19, overlapping planned tenants or
+    when the pool is exhausted.
+    """
+    if not MIN_VPC_PREFIX_LENGTH <= prefix_length <= MAX_VPC_PREFIX_LENGTH:
+        raise ValueError(f"VPC prefix length must be between /{MIN_VPC_PREFIX_LENGTH} and /{MAX_VPC_PREFIX_LENGTH}")
+    for tenant in tenants:
+        if tenant.get("cidr"):
+            check_tenant_cidr(tenant)
+    overlaps = overlapping_tenants(tenants)
+    if overlaps:
+        raise ValueError("Overlapping tenant CIDRs: " + ", ".join(f"{a} and {b}" for a, b in overlaps))
+
+    index = CidrIndex(taken)
+    for tenant in tenants:
+        if tenant.get("cidr"):
+            index.add(tenant["cidr"])
+
+    plan = {}
+    for tenant in tenants:
+        allocated = not tenant.get("cidr")
+        if allocated:
+            network = index.allocate(pool, prefix_length)
+            if network is None:
+                raise ValueError(f"No free /{prefix_length} left in {pool} for tenant {tenant['name']}")
+            cidr = str(network)
+        else:
+            cidr = tenant["cidr"]
+        plan[tenant["name"]] = {"cidr": cidr, "subnets": subnet_cidrs(cidr, az_count), "allocated": allocated}
+    return plan
+
+
+def log_plan(plan):
+    """Log the VPC and per-AZ subnet CIDRs of every tenant."""
+    logger.info("--- CIDR plan ---")
+    for name, entry in plan.items():
+        logger.info(f"{name:<24} {entry['cidr']}" + (" (new)" if entry["allocated"] else ""))
+        for key in SUBNET_CIDR_PARAMETERS:
+            logger.info(f"  {key:<22} {entry['subnets'][key]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tenants', metavar='MANIFEST', required=True, help='JSON tenant manifest to plan.')
+    parser.add_argument('--pool', default=DEFAULT_POOL, help='Address pool tenant VPCs are allocated from.')
+    parser.add_argument('--prefix-length', type=int, default=DEFAULT_VPC_PREFIX_LENGTH,
+                        help='Prefix length of allocated tenant VPCs.')
+    parser.add_argument('--write', action='store_true',
+                        help='Write the allocated CIDRs back into the manifest, so later plans keep them.')
+    parser.add_argument('--offline', action='store_true', help='Do not look up the existing VPCs.')
+    parser.add_argument('--region', help='AWS region (defaults to the configured region).')
+    parser.add_argument('--profile', help='AWS profile (defaults to the configured credentials).')
+    args = parser.parse_args()
+
+    with open(args.tenants, 'r') as f:
+        tenants = json.load(f)
+
+    taken = landing_zone_cidrs()
+    if not args.offline:
+        configure(args.region, args.profile)
+        vpc_cidrs = existing_vpc_cidrs(get_client("ec2"))
+        logger.info(f"Found {len(vpc_cidrs)} existing VPC CIDR(s)")
+        taken.extend(vpc_cidrs)
+
+    try:
+        plan = plan_tenant_cidrs(tenants, taken, args.pool, args.prefix_length)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    log_plan(plan)
+
+    if args.write:
+        for tenant in tenants:
+            tenant["cidr"] = plan[tenant["name"]]["cidr"]
+        with open(args.tenants, 'w') as f:
+            json.dump(tenants, f, indent=2)
+            f.write("\n")
+        logger.info(f"Wrote {sum(e['allocated'] for e in plan.values())} new CIDR(s) to {args.tenants}")
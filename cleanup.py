@@ -1,69 +1,169 @@
-import boto3
 import logging
 import sys
+import argparse
 from botocore.exceptions import ClientError
+from aws_clients import LazyClient, configure, get_client
+from deploy_cache import DEFAULT_CACHE_DIR, DeployCache, cache_path
+from run_state import RunState, run_state_path
+from scheduler import DEFAULT_MAX_WORKERS, build_dependency_graph, reverse_dependency_graph, run_graph
+from nested_stacks import parent_stack_name
+from stacks import DEFAULT_STACK_PREFIX, stack_definitions, tenant_stack_definitions
+from tenants import load_tenant_manifest, tenant_dependency_graph
+from stack_state import StackSnapshot
+from stack_waiter import operation_start, wait_for_stack
+from tracing import tracer
+from api_metrics import api_metrics
 
 # --- Logging setup ---
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-# --- AWS client ---
-cf = boto3.client('cloudformation')
-
-# --- Stack Deletion Order (reverse of creation order) ---
-stack_names = [
-    "LZs3VpcEndpointStack",
-    "LZsftpStack",
-    "LZgwlbeStack",
-    "LZalbStack",
-    "LZsgStack",
-    "LZvgwStack",
-    "LZwafStack",
-    "LZvpcStack"
-]
+# --- AWS client, created on first use ---
+cf = LazyClient('cloudformation')
+
+# --- Stack state, loaded in one sweep on first use ---
+stack_snapshot = StackSnapshot(cf)
+
+# --- Deploy cache and run state of deployment.py, opened in main ---
+deploy_cache = None
+run_state = None
 
 def get_stack_status(stack_name):
     """Check if the stack exists and return its status."""
     try:
-        response = cf.describe_stacks(StackName=stack_name)
-        return response['Stacks'][0]['StackStatus']
+        return stack_snapshot.status(stack_name)
     except ClientError as e:
-        if 'does not exist' in str(e):
-            return None
         logger.error(f"Error checking stack {stack_name}: {e}")
         return None
 
-def wait_for_deletion(stack_name):
-    """Wait until the stack is deleted."""
+def forget_stack(stack_name):
+    """Drop a deleted stack from the deploy cache and run state, so the next deploy creates it again."""
+    if deploy_cache:
+        deploy_cache.forget(stack_name)
+    if run_state:
+        run_state.forget(stack_name)
+
+def wait_for_deletion(stack_name, stack_id, since, request_token):
+    """Wait until the stack is deleted, streaming its events."""
     logger.info(f"Waiting for stack {stack_name} to be deleted...")
-    waiter = cf.get_waiter('stack_delete_complete')
     try:
-        waiter.wait(StackName=stack_name)
-        logger.info(f"Stack {stack_name} deleted successfully.")
+        # Follow the stack by ID so its events stay visible once it is deleted
+        with tracer.span("wait", stack=stack_name, operation="delete_stack"):
+            status = wait_for_stack(cf, stack_id, since, request_token, on_event=tracer.record_stack_event,
+                                    deleting=True)
+        if status == 'DELETE_COMPLETE':
+            logger.info(f"Stack {stack_name} deleted successfully.")
+            stack_snapshot.discard(stack_name)
+            forget_stack(stack_name)
+            return True
+        logger.error(f"Stack {stack_name} finished in state {status} instead of DELETE_COMPLETE")
     except Exception as e:
         logger.error(f"Error waiting for deletion of stack {stack_name}: {e}")
-        sys.exit(1)
+    stack_snapshot.refresh(stack_name)
+    return False
 
 def delete_stack(stack_name):
-    """Delete the specified CloudFormation stack."""
+    """Delete the specified CloudFormation stack. Returns True once it is gone."""
     status = get_stack_status(stack_name)
     if not status:
         logger.info(f"Stack {stack_name} does not exist. Skipping.")
-        return
+        forget_stack(stack_name)
+        return True
     if status.endswith("_IN_PROGRESS"):
         logger.warning(f"Stack {stack_name} is in progress state ({status}). Skipping.")
-        return
+        return False
 
     try:
-        cf.delete_stack(StackName=stack_name)
+        stack_id = stack_snapshot.get(stack_name)['StackId']
+        since, token = operation_start()
+        with tracer.span("delete_stack", stack=stack_name):
+            cf.delete_stack(StackName=stack_name, ClientRequestToken=token)
         logger.info(f"Delete initiated for stack {stack_name}")
-        wait_for_deletion(stack_name)
+        return wait_for_deletion(stack_name, stack_id, since, token)
     except ClientError as e:
         logger.error(f"Failed to delete stack {stack_name}: {e}")
-        sys.exit(1)
+        return False
+
+def delete_all(stack_definitions, max_workers=DEFAULT_MAX_WORKERS, graph=None):
+    """Delete stacks in reverse dependency order, removing independent stacks concurrently.
+
+    graph defaults to the dependency graph of stack_definitions; pass it when
+    the definitions span several tenants, whose output keys repeat.
+    """
+    dependents = reverse_dependency_graph(graph or build_dependency_graph(stack_definitions))
+    deleted = set()
+
+    def run_node(name):
+        with tracer.span(name, "stack"):
+            return delete_stack(name)
+
+    def is_ready(name):
+        # A stack can go once every stack consuming its outputs is gone
+        return dependents[name] <= deleted
+
+    def on_success(name, _):
+        deleted.add(name)
+
+    # Delete leaves first so each wave is listed in reverse creation order
+    names = [s["name"] for s in reversed(stack_definitions)]
+    _, failed, not_started = run_graph(
+        names, is_ready, run_node, on_success, max_workers=max_workers, fail_fast=False
+    )
+
+    if failed:
+        logger.error(f"Failed to delete stacks: {', '.join(failed)}")
+    if not_started:
+        logger.error(f"Stacks kept because a dependent stack remains: {', '.join(not_started)}")
+    return not failed and not not_started
 
 if __name__ == "__main__":
-    for stack in stack_names:
-        delete_stack(stack)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='Maximum number of stacks deleted concurrently.')
+    parser.add_argument('--nested', action='store_true',
+                        help='Delete the parent stack created by deployment.py --nested, and with it every nested stack.')
+    parser.add_argument('--tenants', metavar='MANIFEST',
+                        help='JSON tenant manifest; deletes every tenant\'s stacks instead of the default LZ stacks.')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Directory holding the deploy cache and run state to clear deleted stacks from.')
+    parser.add_argument('--region', help='AWS region (defaults to the configured region).')
+    parser.add_argument('--profile', help='AWS profile (defaults to the configured credentials).')
+    parser.add_argument('--trace-file', help='Write phase and resource timings as a Chrome/Perfetto trace JSON file.')
+    parser.add_argument('--metrics-file', help='Write per-operation AWS API call metrics as an OpenMetrics text file.')
+    args = parser.parse_args()
+    configure(args.region, args.profile, args.max_workers)
+    account_id = get_client('sts').get_caller_identity()['Account']
+    deploy_cache = DeployCache(cache_path(args.cache_dir, account_id, cf.meta.region_name))
+    run_state = RunState(run_state_path(args.cache_dir, account_id, cf.meta.region_name))
+    if args.tenants:
+        try:
+            tenants = load_tenant_manifest(args.tenants)
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid tenant manifest {args.tenants}: {e}")
+            sys.exit(1)
+        if args.nested:
+            stack_definitions = [{"name": parent_stack_name(t["prefix"])} for t in tenants]
+            graph = build_dependency_graph(stack_definitions)
+        else:
+            stack_definitions = [s for t in tenants for s in tenant_stack_definitions(t["prefix"])]
+            graph = tenant_dependency_graph(tenants)
+    else:
+        if args.nested:
+            stack_definitions = [{"name": parent_stack_name(DEFAULT_STACK_PREFIX)}]
+        graph = build_dependency_graph(stack_definitions)
+
+    stack_snapshot.limit_to(s["name"] for s in stack_definitions)
+
+    try:
+        if not delete_all(stack_definitions, max_workers=args.max_workers, graph=graph):
+            sys.exit(1)
+    finally:
+        # A stack's deletion waits on the stacks that consume its outputs
+        tracer.log_summary(reverse_dependency_graph(graph))
+        api_metrics.log_summary()
+        if args.trace_file:
+            tracer.export(args.trace_file)
+        if args.metrics_file:
+            api_metrics.export(args.metrics_file, "cleanup")
 
     logger.info("✅ Cleanup complete.")
@@ -0,0 +1,42 @@
+import hashlib
+import json
+import os
+from json_store import JsonStore
+
+# --- Constants ---
+DEFAULT_CACHE_DIR = ".deploy-cache"
+
+
+def stack_fingerprint(template_body, parameters):
+    """Hash a template body together with its resolved parameters."""
+    digest = hashlib.sha256(template_body.encode("utf-8"))
+    resolved = sorted((p["ParameterKey"], p["ParameterValue"]) for p in parameters)
+    digest.update(json.dumps(resolved).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir, account_id, region):
+    """Return the cache file used for one account/region pair."""
+    return os.path.join(cache_dir, f"{account_id}-{region}.json")
+
+
+class DeployCache(JsonStore):
+    """Fingerprint and outputs of the last successful deploy of each stack."""
+
+    def __init__(self, path):
+        super().__init__(path, "deploy cache")
+
+    def lookup(self, stack_name, fingerprint):
+        """Return the cached outputs if the stack was last deployed with this fingerprint."""
+        entry = self.get(stack_name)
+        if entry and entry.get("fingerprint") == fingerprint:
+            return dict(entry.get("outputs", {}))
+        return None
+
+    def record(self, stack_name, fingerprint, outputs):
+        """Store a successful deploy and persist the cache file."""
+        self.set(stack_name, {"fingerprint": fingerprint, "outputs": outputs})
+
+    def forget(self, stack_name):
+        """Drop a stack so the next run deploys it again."""
+        self.pop(stack_name)
@@ -1,18 +1,45 @@
-import boto3
 import sys
 import os
 import logging
-import subprocess
 import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from aws_clients import LazyClient, configure, get_client
+from scheduler import (DEFAULT_MAX_WORKERS, build_dependency_graph, dependency_closure, dependent_closure,
+                       required_output_keys, run_graph)
+from stacks import (AZ_COUNT, DEFAULT_REGION, DEFAULT_STACK_PREFIX, override_parameters, stack_definitions,
+                    tenant_stack_definitions)
+from tenants import load_tenant_manifest, tenant_dependency_graph
+from deploy_cache import DEFAULT_CACHE_DIR, DeployCache, cache_path, stack_fingerprint
+from run_state import RunState, run_state_path
+from change_sets import delete_change_set, prepare_change_set
+from drift import CHECKABLE_STATUSES, detect_drift, format_drift_report
+from nested_stacks import parent_stack_definition, parent_stack_name
+from stack_recovery import recover_stack, recovery_action, with_backoff
+from stack_state import StackSnapshot
+from stack_waiter import operation_start, wait_for_stack
+from template_store import DEFAULT_TEMPLATE_PREFIX, TemplateStore
+from validate_gwlb_endpoint import validate_gwlb_endpoints
+from template_validation import ValidationCache, check_parameter_wiring, validate_templates
+from tracing import tracer
+from api_metrics import api_metrics
+from rate_limit import DEFAULT_API_BURST, DEFAULT_API_RATE, TokenBucket, attach_rate_limiter
+from upload_cert_to_acm import CERT_FILE, DEFAULT_RENEWAL_DAYS, KEY_FILE, ensure_certificate
 
 # --- Logging setup ---
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-# --- AWS clients ---
-cf = boto3.client('cloudformation')
-ec2 = boto3.client('ec2')
+# --- AWS clients, created on first use ---
+cf = LazyClient('cloudformation')
+ec2 = LazyClient('ec2')
+
+# --- Stack state, loaded in one sweep on first use ---
+stack_snapshot = StackSnapshot(cf)
+
+# --- S3 template staging, configured by --template-bucket ---
+template_store = None
 
 # --- Constants ---
 TEMPLATE_DIR = "templates"
@@ -20,171 +47,125 @@ TEMPLATE_DIR = "templates"
 # --- Argument parsing ---
 parser = argparse.ArgumentParser()
 parser.add_argument('--force', action='store_true', help='Force update stacks even if already completed.')
-args = parser.parse_args()
-
-# --- Stack deployment definitions ---
-stack_definitions = [
-    {
-        "name": "LZvpcStack",
-        "template": "vpc.yaml",
-        "parameters": [
-            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
-            {"ParameterKey": "Owner", "ParameterValue": "YourName"},
-            {"ParameterKey": "BusinessUnit", "ParameterValue": "Cloud"},
-            {"ParameterKey": "VpcCidr", "ParameterValue": "10.10.0.0/16"},
-            {"ParameterKey": "Region", "ParameterValue": "ap-southeast-1"},
-            {"ParameterKey": "AvailabilityZones", "ParameterValue": "ap-southeast-1a,ap-southeast-1b,ap-southeast-1c"},
-            {"ParameterKey": "PublicSubnetCidrs", "ParameterValue": "10.10.1.0/24,10.10.2.0/24,10.10.3.0/24"},
-            {"ParameterKey": "PrivateSubnetCidrs", "ParameterValue": "10.10.4.0/24,10.10.5.0/24,10.10.6.0/24"},
-            {"ParameterKey": "ALBSubnetCidrs", "ParameterValue": "10.10.7.0/24,10.10.8.0/24,10.10.9.0/24"},
-            {"ParameterKey": "GWLBSubnetCidrs", "ParameterValue": "10.10.10.0/24,10.10.11.0/24,10.10.12.0/24"},
-            {"ParameterKey": "SFTPSubnetCidrs", "ParameterValue": "10.10.13.0/24,10.10.14.0/24,10.10.15.0/24"},
-            {"ParameterKey": "APIGWSubnetCidrs", "ParameterValue": "10.10.16.0/24,10.10.17.0/24,10.10.18.0/24"}
-        ],
-        "outputs": [
-            "VpcId", "ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id",
-            "APIGWSubnet1Id", "APIGWSubnet2Id",
-            "GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id",
-            "SFTPSubnet1Id", "SFTPSubnet2Id", "SFTPSubnet3Id"
-        ]
-    },
-    {
-        "name": "LZwafStack",
-        "template": "waf.yaml",
-        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
-        "outputs": ["WebACLArn"]
-    },
-    {
-        "name": "LZvgwStack",
-        "template": "vgw.yaml",
-        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
-        "parameters_from_outputs": [
-            {"output_key": "VpcId", "parameter_key": "VpcId"}
-        ]
-    },
-    {
-        "name": "LZsgStack",
-        "template": "security-groups.yaml",
-        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
-        "parameters_from_outputs": [
-            {"output_key": "VpcId", "parameter_key": "VpcId"}
-        ],
-        "outputs": [
-            "ALBSecurityGroupId",
-            "TargetGroupSecurityGroupId",
-            "ApiGatewayEndpointSecurityGroupId",
-            "SFTPSecurityGroupId"
-        ]
-    },
-    {
-    "name": "LZalbStack",
-    "template": "alb.yaml",
-    "parameters": [
-        {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
-        {
-            "ParameterKey": "ACMCertificateArn",
-            "ParameterValue": "arn:aws:acm:ap-southeast-1:975050199901:certificate/054f77c3-aec0-488d-ab55-8a2b552c1c90"
-        }
-    ],
-    "parameters_from_outputs": [
-        {"output_key": "VpcId", "parameter_key": "VpcId"},
-        {
-            "output_keys": ["ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id"],
-            "parameter_key": "ALBSubnetIds"
-        },
-        {"output_key": "ALBSecurityGroupId", "parameter_key": "ALBSecurityGroupId"},
-        {"output_key": "TargetGroupSecurityGroupId", "parameter_key": "TargetGroupSecurityGroupId"},
-        {"output_key": "WebACLArn", "parameter_key": "WAFWebACLArn"}
-    ],
-    "outputs": [
-        "ALBArn",
-        "ALBTargetGroupArn"
-    ]
-    },
-
-    {
-        "name": "LZgwlbeStack",
-        "template": "gwlb-endpoint.yaml",
-        "parameters": [
-            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
-            {"ParameterKey": "ServiceName", "ParameterValue": "com.amazonaws.vpce.ap-southeast-1.vpce-svc-0eaa5d68deb2856ba"}
-        ],
-        "parameters_from_outputs": [
-            {
-                "output_keys": ["GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id"],
-                "parameter_key": "SubnetIds"
-            },
-            {"output_key": "VpcId", "parameter_key": "VpcId"}
-        ],
-        "outputs": ["GWLBEId1", "GWLBEId2", "GWLBEId3"]
-    },
-    {
-        "name": "LZsftpStack",
-        "template": "sftp-endpoint.yaml",
-        "parameters": [
-            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}
-        ],
-        "parameters_from_outputs": [
-            {"output_key": "VpcId", "parameter_key": "VpcId"},
-            {"output_key": "SFTPSubnetIds", "parameter_key": "SFTPSubnetIds"},
-            {"output_key": "SFTPSecurityGroupId", "parameter_key": "SecurityGroupId"}
-        ],
-        "outputs": ["SFTPVpcEndpointId"]
-    },
-{
-    "name": "LZs3VpcEndpointStack",
-    "template": "s3-vpc-endpoint.yaml", 
-    "parameters": [
-        {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
-        {"ParameterKey": "VpcId", "ParameterValue": ""}
-    ],
-    "parameters_from_outputs": [
-        {"output_key": "VpcId", "parameter_key": "VpcId"}
-    ],
-    "outputs": ["S3VpcEndpointId"]
-}
-]
-def wait_for_completion(stack_name, operation):
-    """Wait for a CloudFormation stack operation to complete."""
-    waiter_name = 'stack_create_complete' if operation == 'create_stack' else 'stack_update_complete'
-    waiter = cf.get_waiter(waiter_name)
+parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                    help='Maximum number of stacks deployed concurrently.')
+parser.add_argument('--cache', action='store_true',
+                    help='Skip stacks whose template and parameters match the last successful deploy, and update the rest.')
+parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Directory holding the deploy cache and run state.')
+parser.add_argument('--change-sets', action='store_true',
+                    help='Update existing stacks through change sets, skipping those without changes.')
+parser.add_argument('--tenants', metavar='MANIFEST',
+                    help='JSON tenant manifest; deploys one stack set per tenant instead of the default LZ stacks.')
+parser.add_argument('--max-tenants', type=int, default=DEFAULT_MAX_WORKERS,
+                    help='Maximum number of tenants deployed concurrently (with --tenants).')
+parser.add_argument('--api-rate', type=float, default=DEFAULT_API_RATE,
+                    help='CloudFormation and EC2 requests per second, per service (with --tenants).')
+parser.add_argument('--api-burst', type=int, default=DEFAULT_API_BURST,
+                    help='Request burst allowed above --api-rate (with --tenants).')
+parser.add_argument('--template-bucket',
+                    help='Stage templates in this S3 bucket under content-hash keys and deploy them by TemplateURL.')
+parser.add_argument('--template-prefix', default=DEFAULT_TEMPLATE_PREFIX, help='Key prefix for staged templates.')
+parser.add_argument('--s3-endpoint-url', help='Custom S3 endpoint, e.g. a local S3 stand-in.')
+parser.add_argument('--only', action='append', metavar='STACK',
+                    help='Deploy or update only this stack (repeatable), taking upstream outputs from the run state.')
+parser.add_argument('--resume-from', metavar='STACK',
+                    help='Deploy this stack, every stack downstream of it and every stack not completed yet.')
+parser.add_argument('--alb-certificate', action=argparse.BooleanOptionalAction, default=True,
+                    help='Reuse or rotate the ALB certificate in ACM and pass its ARN to the ALB stacks '
+                         '(default); --no-alb-certificate keeps the ARN set in stacks.py.')
+parser.add_argument('--gwlb-service-name',
+                    help=f'GWLB endpoint service name; required outside {DEFAULT_REGION}, whose service is the default.')
+parser.add_argument('--renewal-days', type=int, default=DEFAULT_RENEWAL_DAYS,
+                    help='Rotate the ALB certificate when it expires within this many days (with --alb-certificate).')
+parser.add_argument('--drift', action='store_true',
+                    help='Detect drift on all managed stacks in one parallel sweep and report it, without deploying.')
+parser.add_argument('--update-drifted', action='store_true',
+                    help='Detect drift, update the drifted stacks only (as with --force), '
+                         'then fail if they are still drifted.')
+parser.add_argument('--nested', action='store_true',
+                    help='Deploy each stack set as one generated parent stack of nested stacks (requires --template-bucket).')
+parser.add_argument('--region', help='AWS region (defaults to the configured region).')
+parser.add_argument('--profile', help='AWS profile (defaults to the configured credentials).')
+parser.add_argument('--trace-file', help='Write phase and resource timings as a Chrome/Perfetto trace JSON file.')
+parser.add_argument('--metrics-file', help='Write per-operation AWS API call metrics as an OpenMetrics text file.')
+# Defaults for library use; the command line is parsed when run as a script
+args = parser.parse_args([])
+
+def wait_for_completion(stack_name, operation, since, request_token):
+    """Wait for a CloudFormation stack operation to complete, streaming its events."""
+    expected_status = 'CREATE_COMPLETE' if operation == 'create_stack' else 'UPDATE_COMPLETE'
     logger.info(f"Waiting for {stack_name} to {operation.replace('_', ' ')}...")
     try:
-        waiter.wait(StackName=stack_name)
-        logger.info(f"{stack_name} {operation.replace('_', ' ')} completed successfully.")
+        with tracer.span("wait", stack=stack_name, operation=operation):
+            status = wait_for_stack(cf, stack_name, since, request_token, on_event=tracer.record_stack_event)
+        if status == expected_status:
+            logger.info(f"{stack_name} {operation.replace('_', ' ')} completed successfully.")
+            return True
+        logger.error(f"Stack {stack_name} finished in state {status} instead of {expected_status}")
+        return False
     except Exception as e:
         logger.error(f"Error during stack wait: {e}")
-        sys.exit(1)  # Exit if waiting fails
+        return False
+    finally:
+        stack_snapshot.refresh(stack_name)
 
 def get_stack_status(stack_name):
     """Retrieve the current status of a CloudFormation stack."""
     try:
-        response = cf.describe_stacks(StackName=stack_name)
-        return response['Stacks'][0]['StackStatus']
+        return stack_snapshot.status(stack_name)
     except ClientError as e:
-        if 'does not exist' in str(e):
-            return None
         logger.error(f"Failed to get status of stack {stack_name}: {e}")
         return None
 
-def deploy_stack(stack_def, collected_outputs):
-    """Deploy a CloudFormation stack based on the provided definition."""
-    stack_name = stack_def["name"]
+def cached_outputs(cache, stack_name, fingerprint):
+    """Return the cached outputs of an unchanged stack, or None if it must be deployed.
+
+    A fingerprint match is only trusted while the stack still exists in a
+    completed state, so stacks deleted or broken outside the pipeline are
+    deployed again.
+    """
+    if not cache or args.force:
+        return None
+    outputs = cache.lookup(stack_name, fingerprint)
+    if outputs is None:
+        return None
+    status = get_stack_status(stack_name)
+    if status not in ["CREATE_COMPLETE", "UPDATE_COMPLETE"]:
+        logger.info(f"Ignoring cached deploy of stack {stack_name}: it is {status or 'missing'}.")
+        cache.forget(stack_name)
+        return None
+    return outputs
+
+def describe_stack(stack_name):
+    """Re-describe a stack and return its describe_stacks entry, or None if it does not exist."""
+    stack_snapshot.refresh(stack_name)
+    return stack_snapshot.get(stack_name)
+
+def recover(stack_name, stack_status):
+    """Apply the recovery policy for a stack status; returns the new status, None if gone, or False."""
+    if not recovery_action(stack_status):
+        return stack_status
+    with tracer.span("recover", stack=stack_name, status=stack_status):
+        return recover_stack(cf, describe_stack, stack_name, on_event=tracer.record_stack_event)
+
+def load_template(stack_def):
+    """Read the template body for a stack definition, or None if it is missing."""
+    # Generated templates carry their body in the definition
+    if "template_body" in stack_def:
+        return stack_def["template_body"]
+
     template_path = os.path.join(TEMPLATE_DIR, stack_def["template"])
 
     if not os.path.isfile(template_path):
         logger.error(f"Template file not found: {template_path}")
-        return False
+        return None
 
     with open(template_path, 'r') as f:
-        template_body = f.read()
-
-    try:
-        cf.validate_template(TemplateBody=template_body)
-    except ClientError as e:
-        logger.error(f"Template validation failed: {e}")
-        return False
+        return f.read()
 
+def resolve_parameters(stack_def, collected_outputs):
+    """Build the stack parameter list from static values and collected outputs."""
+    stack_name = stack_def["name"]
     parameters = list(stack_def.get("parameters", []))
 
     for p in stack_def.get("parameters_from_outputs", []):
@@ -192,7 +173,7 @@ def deploy_stack(stack_def, collected_outputs):
             key = p["output_key"]
             if key not in collected_outputs:
                 logger.error(f"Missing required output '{key}' for stack {stack_name}")
-                return False
+                return None
             parameters.append({
                 "ParameterKey": p["parameter_key"],
                 "ParameterValue": collected_outputs[key]
@@ -202,43 +183,91 @@ def deploy_stack(stack_def, collected_outputs):
             if None in values:
                 missing = [k for k, v in zip(p["output_keys"], values) if v is None]
                 logger.error(f"Missing required output(s) {', '.join(missing)} for stack {stack_name}")
-                return False
+                return None
             parameters.append({
                 "ParameterKey": p["parameter_key"],
                 "ParameterValue": ",".join(values)
             })
         else:
             logger.error(f"Invalid parameter mapping in stack {stack_name}: {p}")
+            return None
+
+    return parameters
+
+def template_source(template_name, template_body):
+    """Return the TemplateBody or, when staging to S3, the TemplateURL argument for a template."""
+    if template_store is None:
+        return {"TemplateBody": template_body}
+    return {"TemplateURL": template_store.url_for(template_name, template_body)}
+
+def update_with_change_set(stack_def, template_body, parameters, plan=None):
+    """Update a stack through a change set, executing it only if it has changes."""
+    stack_name = stack_def["name"]
+
+    # A plan made before upstream stacks changed their outputs is stale
+    if plan is None or plan["fingerprint"] != stack_fingerprint(template_body, parameters):
+        if plan and plan["change_set_id"]:
+            delete_change_set(cf, plan["change_set_id"])
+        try:
+            with tracer.span("prepare_change_set", stack=stack_name):
+                plan = prepare_change_set(cf, stack_name, template_body, parameters,
+                                          template_source(stack_def["template"], template_body))
+        except RuntimeError as e:
+            logger.error(f"Error preparing change set for stack {stack_name}: {e}")
             return False
 
-    stack_status = get_stack_status(stack_name)
+    if not plan["change_set_id"]:
+        return True
+
+    since, token = operation_start()
+    with tracer.span("execute_change_set", stack=stack_name):
+        cf.execute_change_set(ChangeSetName=plan["change_set_id"], ClientRequestToken=token)
+    logger.info(f"Executing change set for stack {stack_name}")
+    return wait_for_completion(stack_name, 'update_stack', since, token)
+
+def deploy_stack(stack_def, template_body, parameters, update_existing=False, plan=None):
+    """Deploy a CloudFormation stack based on the provided definition."""
+    stack_name = stack_def["name"]
+
+    stack_status = recover(stack_name, get_stack_status(stack_name))
+    if stack_status is False:
+        return False
     try:
+        source = template_source(stack_def["template"], template_body)
+        since, token = operation_start()
         if not stack_status:
-            response = cf.create_stack(
-                StackName=stack_name,
-                TemplateBody=template_body,
-                Parameters=parameters,
-                Capabilities=['CAPABILITY_NAMED_IAM'],
-                DisableRollback=True
-            )
+            # Retries reuse the request token, so a create that reached CloudFormation is not repeated
+            with tracer.span("create_stack", stack=stack_name):
+                response = with_backoff(lambda: cf.create_stack(
+                    StackName=stack_name,
+                    Parameters=parameters,
+                    **source,
+                    Capabilities=['CAPABILITY_NAMED_IAM'],
+                    DisableRollback=True,
+                    ClientRequestToken=token
+                ), f"create of {stack_name}")
             logger.info(f"Creating stack: {response['StackId']}")
-            wait_for_completion(stack_name, 'create_stack')
-        elif stack_status in ["CREATE_COMPLETE", "UPDATE_COMPLETE"]:
-            if not args.force:
+            return wait_for_completion(stack_name, 'create_stack', since, token)
+        elif stack_status in ["CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE"]:
+            # A rolled-back update left the stack on its old template, so it is always updated
+            if not update_existing and stack_status != "UPDATE_ROLLBACK_COMPLETE":
                 logger.info(f"Stack {stack_name} already exists. Skipping (use --force to override).")
                 return True
-            cf.update_stack(
-                StackName=stack_name,
-                TemplateBody=template_body,
-                Parameters=parameters,
-                Capabilities=['CAPABILITY_NAMED_IAM']
-            )
+            if args.change_sets:
+                return update_with_change_set(stack_def, template_body, parameters, plan)
+            with tracer.span("update_stack", stack=stack_name):
+                with_backoff(lambda: cf.update_stack(
+                    StackName=stack_name,
+                    Parameters=parameters,
+                    **source,
+                    Capabilities=['CAPABILITY_NAMED_IAM'],
+                    ClientRequestToken=token
+                ), f"update of {stack_name}")
             logger.info(f"Updating stack {stack_name}")
-            wait_for_completion(stack_name, 'update_stack')
+            return wait_for_completion(stack_name, 'update_stack', since, token)
         else:
             logger.error(f"Stack {stack_name} is in unexpected state: {stack_status}")
             return False
-        return True
     except ClientError as e:
         if "No updates are to be performed" in str(e):
             logger.info(f"No updates needed for stack {stack_name}.")
@@ -249,8 +278,7 @@ def deploy_stack(stack_def, collected_outputs):
 def get_stack_outputs(stack_name):
     """Retrieve the outputs of a CloudFormation stack."""
     try:
-        response = cf.describe_stacks(StackName=stack_name)
-        return {o['OutputKey']: o['OutputValue'] for o in response['Stacks'][0].get('Outputs', [])}
+        return stack_snapshot.outputs(stack_name)
     except ClientError as e:
         logger.error(f"Failed to get outputs for {stack_name}: {e}")
         return {}
@@ -258,87 +286,513 @@ def get_stack_outputs(stack_name):
 def set_vpc_dns_attributes(vpc_id):
     """Enable DNS support and hostnames for the specified VPC."""
     try:
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+        with tracer.span("set_vpc_dns_attributes", vpc=vpc_id):
+            ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
+            ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
         logger.info(f"Enabled DNS support and hostnames for VPC {vpc_id}")
+        return True
     except ClientError as e:
         logger.error(f"Failed to modify VPC DNS attributes: {e}")
-        sys.exit(1)
+        return False
+
+def collect_stack_outputs(stack_def):
+    """Collect declared and derived outputs of a deployed stack, or None on failure."""
+    stack_name = stack_def["name"]
+    with tracer.span("collect_outputs", stack=stack_name):
+        outputs = get_stack_outputs(stack_name)
+
+    collected = {}
+    for key in stack_def.get("outputs", []):
+        if key in outputs:
+            collected[key] = outputs[key]
+        else:
+            logger.warning(f"Output '{key}' not found in {stack_name}")
+
+    # Derived outputs join several outputs into one comma-separated parameter value
+    for key, parts in stack_def.get("derived_outputs", {}).items():
+        missing = [k for k in parts if k not in collected]
+        if missing:
+            logger.error(f"Missing outputs for {key}: {', '.join(missing)}")
+            return None
+        collected[key] = ",".join(collected[k] for k in parts)
+
+    if stack_def.get("derived_outputs"):
+        logger.info(f"--- Derived Outputs after {stack_name} ---")
+        for key in stack_def["derived_outputs"]:
+            logger.info(f"{key}: {collected[key]}")
+
+    return collected
+
+def run_stack(stack_def, collected_outputs, cache=None, plan=None):
+    """Deploy a stack and return the outputs it contributes, or None on failure."""
+    stack_name = stack_def["name"]
+
+    template_body = load_template(stack_def)
+    if template_body is None:
+        return None
+
+    parameters = resolve_parameters(stack_def, collected_outputs)
+    if parameters is None:
+        return None
+
+    # Unchanged template and parameters since the last successful deploy: no API calls
+    fingerprint = stack_fingerprint(template_body, parameters)
+    outputs = cached_outputs(cache, stack_name, fingerprint)
+    if outputs is not None:
+        logger.info(f"Stack {stack_name} unchanged since last deploy. Skipping.")
+        return outputs
+
+    # With a cache, a miss means the template or parameters changed (or are unknown); a stack
+    # picked with --only is meant to be redeployed
+    update_existing = args.force or args.change_sets or cache is not None or bool(args.only)
+    if not deploy_stack(stack_def, template_body, parameters, update_existing, plan):
+        if cache:
+            cache.forget(stack_name)
+        return None
+
+    outputs = collect_stack_outputs(stack_def)
+    if outputs is None:
+        return None
+
+    # Enable DNS attributes
+    if stack_def.get("enable_vpc_dns") and not set_vpc_dns_attributes(outputs["VpcId"]):
+        return None
+
+    if cache:
+        cache.record(stack_name, fingerprint, outputs)
+    return outputs
+
+def deploy_all(stack_definitions, collected_outputs, max_workers=DEFAULT_MAX_WORKERS, cache=None, plans=None,
+               executor=None, only=None, run_state=None):
+    """Deploy stacks in dependency order, running independent stacks concurrently.
+
+    only restricts the run to a set of stack names; collected_outputs must then
+    already hold the outputs of the stacks upstream of them. Stacks that succeed
+    are recorded in run_state and stacks that fail are dropped from it.
+    """
+    try:
+        build_dependency_graph(stack_definitions)
+    except ValueError as e:
+        logger.error(f"Invalid stack definitions: {e}")
+        return False
+
+    stacks_by_name = {s["name"]: s for s in stack_definitions}
+
+    def is_ready(name):
+        return all(k in collected_outputs for k in required_output_keys(stacks_by_name[name]))
+
+    def run_node(name):
+        # Each worker gets its own snapshot; outputs are merged on the scheduling thread
+        with tracer.span(name, "stack"):
+            return run_stack(stacks_by_name[name], dict(collected_outputs), cache, (plans or {}).get(name))
+
+    def on_success(name, outputs):
+        collected_outputs.update(outputs)
+        if run_state:
+            run_state.record(name, outputs)
+
+    names = [name for name in stacks_by_name if only is None or name in only]
+    succeeded, failed, not_started = run_graph(
+        names, is_ready, run_node, on_success, max_workers=max_workers, executor=executor
+    )
+
+    if run_state:
+        for name in failed:
+            run_state.forget(name)
+
+    # Planned change sets of stacks that failed or never ran would otherwise linger on the stack
+    for name in failed + not_started:
+        plan = (plans or {}).get(name)
+        if plan and plan["change_set_id"]:
+            delete_change_set(cf, plan["change_set_id"])
+
+    if failed:
+        logger.error(f"Failed stacks: {', '.join(failed)}")
+    if not_started:
+        logger.error(f"Stacks not started: {', '.join(not_started)}")
+    return not failed and not not_started
+
+def plan_change_sets(stack_definitions, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+    """Create change sets for all existing stacks at once and drop the empty ones.
+
+    Parameters are resolved from the live outputs of the deployed stacks.
+    Returns a dict of stack name to plan for deploy_all.
+    """
+    with tracer.span("plan_change_sets"), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        statuses = list(pool.map(lambda s: get_stack_status(s["name"]), stack_definitions))
+        existing = [s for s, status in zip(stack_definitions, statuses)
+                    if status in ["CREATE_COMPLETE", "UPDATE_COMPLETE"]]
+
+        live_outputs = {}
+        for outputs in pool.map(collect_stack_outputs, existing):
+            live_outputs.update(outputs or {})
+
+        def plan(stack_def):
+            stack_name = stack_def["name"]
+            template_body = load_template(stack_def)
+            parameters = resolve_parameters(stack_def, live_outputs) if template_body is not None else None
+            if parameters is None:
+                return None
+            if cached_outputs(cache, stack_name, stack_fingerprint(template_body, parameters)) is not None:
+                return None
+            try:
+                return prepare_change_set(cf, stack_name, template_body, parameters,
+                                          template_source(stack_def["template"], template_body))
+            except (ClientError, RuntimeError) as e:
+                logger.warning(f"Could not plan change set for stack {stack_name}: {e}")
+                return None
+
+        plans = dict(zip((s["name"] for s in existing), pool.map(plan, existing)))
+
+    changed = [name for name, p in plans.items() if p and p["change_set_id"]]
+    logger.info(f"Change sets with changes: {', '.join(changed) or 'none'}")
+    return {name: p for name, p in plans.items() if p}
+
+def nested_definitions(stack_definitions, prefix=DEFAULT_STACK_PREFIX):
+    """Stage every template and return the one-stack definition list of the parent stack, or None on failure."""
+    template_urls = {}
+    for stack_def in stack_definitions:
+        if stack_def["template"] not in template_urls:
+            template_body = load_template(stack_def)
+            if template_body is None:
+                return None
+            template_urls[stack_def["template"]] = template_store.url_for(stack_def["template"], template_body)
+    return [parent_stack_definition(stack_definitions, prefix, template_urls)]
+
+def account_and_region():
+    """Return the account ID and region the stacks are deployed to."""
+    return get_client('sts').get_caller_identity()['Account'], cf.meta.region_name
+
+def region_parameters(region):
+    """Region and AvailabilityZones parameters for the region the stacks are deployed to.
+
+    Uses the first AZ_COUNT available zones in name order; raises ValueError
+    when the region has fewer.
+    """
+    response = ec2.describe_availability_zones(Filters=[{"Name": "zone-type", "Values": ["availability-zone"]},
+                                                        {"Name": "state", "Values": ["available"]}])
+    zones = sorted(z["ZoneName"] for z in response["AvailabilityZones"])
+    if len(zones) < AZ_COUNT:
+        raise ValueError(f"Region {region} has {len(zones)} available AZ(s); the stacks need {AZ_COUNT}")
+    return {"Region": region, "AvailabilityZones": ",".join(zones[:AZ_COUNT])}
+
+def select_stacks(graph, only=None, resume_from=None, completed=()):
+    """Return the stack names to deploy for --only/--resume-from, or None for all stacks.
+
+    --only picks exactly the named stacks. --resume-from picks the stack, every
+    stack downstream of it and every stack without recorded outputs.
+    """
+    requested = list(only or []) + ([resume_from] if resume_from else [])
+    unknown = [name for name in requested if name not in graph]
+    if unknown:
+        raise ValueError(f"Unknown stack(s): {', '.join(unknown)}")
+    if only:
+        return set(only)
+    if resume_from:
+        return dependent_closure(graph, [resume_from]) | (set(graph) - set(completed))
+    return None
+
+def known_outputs(stack_def, run_state):
+    """Return the recorded outputs of a stack, or None if it is not deployed.
+
+    A stack without recorded outputs (e.g. a fresh CI checkout) is read from
+    its live outputs instead, and recorded for next time.
+    """
+    outputs = run_state.outputs(stack_def["name"])
+    if outputs is None:
+        if get_stack_status(stack_def["name"]) not in ["CREATE_COMPLETE", "UPDATE_COMPLETE"]:
+            return None
+        outputs = collect_stack_outputs(stack_def)
+        if outputs is None:
+            return None
+        run_state.record(stack_def["name"], outputs)
+    return outputs
+
+def upstream_outputs(stack_definitions, graph, selected, run_state):
+    """Gather the outputs of every stack upstream of the selected ones, or None on failure."""
+    stacks_by_name = {s["name"]: s for s in stack_definitions}
+    collected = {}
+    for name in sorted(dependency_closure(graph, selected) - selected):
+        outputs = known_outputs(stacks_by_name[name], run_state)
+        if outputs is None:
+            logger.error(f"Upstream stack {name} is not deployed or its outputs are unavailable; include it in the run.")
+            return None
+        collected.update(outputs)
+    return collected
+
+def skipped_outputs(stack_definitions, selected, run_state):
+    """Gather the outputs of the deployed stacks outside a partial run, e.g. for GWLB validation."""
+    collected = {}
+    for stack_def in stack_definitions:
+        if stack_def["name"] not in selected:
+            collected.update(known_outputs(stack_def, run_state) or {})
+    return collected
+
+def deploy_tenant(tenant, executor, cache=None, run_state=None, only=None):
+    """Deploy one tenant's stacks on the shared executor and return its result summary.
+
+    only restricts the run to these stack names; upstream outputs then come
+    from run_state.
+    """
+    started = time.monotonic()
+    result = {"tenant": tenant["name"], "prefix": tenant["prefix"], "success": False, "outputs": {}}
+    try:
+        definitions = tenant_stack_definitions(tenant["prefix"], tenant.get("cidr"), tenant.get("parameters"))
+        if args.nested:
+            definitions = nested_definitions(definitions, tenant["prefix"])
+            if definitions is None:
+                raise RuntimeError("templates could not be staged")
+        selected = None
+        if only is not None:
+            selected = {s["name"] for s in definitions} & set(only)
+            seeded = upstream_outputs(definitions, build_dependency_graph(definitions), selected, run_state)
+            if seeded is None:
+                raise RuntimeError("outputs of upstream stacks are unavailable")
+            result["outputs"].update(seeded)
+            definitions_to_plan = [s for s in definitions if s["name"] in selected]
+        else:
+            definitions_to_plan = definitions
+        plans = plan_change_sets(definitions_to_plan, cache=cache) if args.change_sets else None
+        result["success"] = deploy_all(definitions, result["outputs"], cache=cache, plans=plans, executor=executor,
+                                       only=selected, run_state=run_state)
+        if selected is not None and run_state:
+            result["outputs"] = {**skipped_outputs(definitions, selected, run_state), **result["outputs"]}
+    except Exception as e:
+        logger.error(f"Tenant {tenant['name']} failed: {e}")
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+def deploy_tenants(tenants, max_tenants=DEFAULT_MAX_WORKERS, max_workers=DEFAULT_MAX_WORKERS, cache=None,
+                   run_state=None, only=None):
+    """Deploy many tenants at once; a failed tenant does not stop the others.
+
+    All tenants share one stack worker pool, so at most max_workers stack
+    operations run at the same time across the whole fan-out.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as stack_pool, \
+            ThreadPoolExecutor(max_workers=max_tenants) as tenant_pool:
+        results = list(tenant_pool.map(lambda t: deploy_tenant(t, stack_pool, cache, run_state, only), tenants))
+
+    logger.info("--- Tenant deployment summary ---")
+    for r in results:
+        logger.info(f"{r['tenant']:<24} {r['prefix']:<16} {'OK' if r['success'] else 'FAILED':<7} {r['elapsed']:.0f}s")
+    failed = [r["tenant"] for r in results if not r["success"]]
+    logger.info(f"{len(results) - len(failed)}/{len(results)} tenants deployed successfully.")
+    return results
+
+def check_drift(stack_names, max_workers=DEFAULT_MAX_WORKERS):
+    """Detect drift on every deployed stack at once and log the drifted resources.
+
+    Returns the set of drifted stack names, or None if detection failed for
+    any stack.
+    """
+    deployed = [name for name in stack_names if get_stack_status(name) in CHECKABLE_STATUSES]
+    skipped = [name for name in stack_names if name not in deployed]
+    if skipped:
+        logger.info(f"Not checking drift of stacks that are not deployed: {', '.join(skipped)}")
+
+    with tracer.span("detect_drift"):
+        results = detect_drift(cf, deployed, max_workers)
+
+    logger.info("--- Drift summary ---")
+    for name, result in results.items():
+        logger.info(f"{name:<32} {result['status']}")
+        if result["resources"]:
+            logger.warning(format_drift_report(name, result["resources"]))
+        elif result["status"] == "DETECTION_FAILED":
+            logger.error(f"Drift detection failed for {name}: {result['reason']}")
+
+    if any(r["status"] == "DETECTION_FAILED" for r in results.values()):
+        return None
+    return {name for name, result in results.items() if result["status"] == "DRIFTED"}
+
+def drift_resolved(stack_names, max_workers=DEFAULT_MAX_WORKERS):
+    """Re-check drift on stacks that were just updated; returns True once all of them are back in sync.
+
+    An update with an unchanged template and parameters is a no-op for
+    CloudFormation ("No updates are to be performed"), so it leaves drift in place.
+    """
+    still_drifted = check_drift(stack_names, max_workers)
+    if still_drifted is None:
+        logger.error("Drift detection after the update failed; drift of the updated stacks is unknown.")
+        return False
+    for name in sorted(still_drifted):
+        logger.error(f"Stack {name} is still DRIFTED after the update: an update with an unchanged template and "
+                     "parameters does not revert drift. Fix the resources or change the template.")
+    if not still_drifted:
+        logger.info(f"Drift resolved on: {', '.join(sorted(stack_names))}")
+    return not still_drifted
+
+def preflight(stack_definitions, cache_dir, max_workers=DEFAULT_MAX_WORKERS):
+    """Validate all templates and the stack parameter wiring before any stack operation."""
+    with tracer.span("preflight"):
+        declared = validate_templates(cf, TEMPLATE_DIR, template_source, ValidationCache(cache_dir), max_workers)
+    if declared is None:
+        return False
+
+    problems = check_parameter_wiring(stack_definitions, declared)
+    for problem in problems:
+        logger.error(f"Parameter check failed: {problem}")
+    return not problems
+
+def gwlb_endpoints_by_vpc(collected_outputs):
+    """Map the deployed VPC to the GWLBEId* endpoint IDs collected from its stacks."""
+    endpoint_ids = [v for k, v in sorted(collected_outputs.items()) if k.startswith("GWLBEId")]
+    if "VpcId" not in collected_outputs or not endpoint_ids:
+        return {}
+    return {collected_outputs["VpcId"]: endpoint_ids}
+
+def validate_gwlb_endpoint(endpoints_by_vpc, max_workers=DEFAULT_MAX_WORKERS):
+    """Validate the GWLB endpoints created by this run."""
+    if not endpoints_by_vpc:
+        logger.error("No GWLB endpoint outputs were collected; nothing to validate.")
+        return False
+    with tracer.span("validate_gwlb_endpoint"):
+        return validate_gwlb_endpoints(ec2, endpoints_by_vpc, max_workers=max_workers)
+
+def report_timings(graph, trace_file=None, metrics_file=None):
+    """Log the critical path, slowest resources and API calls, and export the trace and metrics if requested."""
+    tracer.log_summary(graph)
+    api_metrics.log_summary()
+    if trace_file:
+        tracer.export(trace_file)
+    if metrics_file:
+        api_metrics.export(metrics_file, "deployment")
 
 if __name__ == "__main__":
-    collected_outputs = {}
+    args = parser.parse_args()
+    if args.tenants and (args.only or args.resume_from):
+        parser.error("--only and --resume-from cannot be combined with --tenants")
+    if args.update_drifted and (args.only or args.resume_from):
+        parser.error("--update-drifted selects its own stacks; it cannot be combined with --only or --resume-from")
+    if args.nested and (args.only or args.resume_from or args.drift or args.update_drifted):
+        parser.error("--nested deploys whole stack sets; it cannot be combined with --only, --resume-from or drift modes")
+    if args.nested and not args.template_bucket:
+        parser.error("--nested requires --template-bucket: nested stacks are created from TemplateURLs")
 
-    for stack in stack_definitions:
-        success = deploy_stack(stack, collected_outputs)
-        if not success:
-            logger.error("Aborting pipeline due to failed stack.")
+    # Stack workers and tenant threads may all be calling AWS at once
+    configure(args.region, args.profile, args.max_workers + (args.max_tenants if args.tenants else 0))
+    account_id, region = account_and_region()
+    # The default GWLB endpoint service and certificate ARN only exist in the default region
+    if region != DEFAULT_REGION and not args.gwlb_service_name:
+        parser.error(f"--gwlb-service-name is required when deploying outside {DEFAULT_REGION} (region: {region})")
+    if region != DEFAULT_REGION and not args.alb_certificate:
+        parser.error(f"--no-alb-certificate keeps an ACM ARN from {DEFAULT_REGION}; it cannot deploy to {region}")
+    cache = DeployCache(cache_path(args.cache_dir, account_id, region)) if args.cache else None
+    run_state = RunState(run_state_path(args.cache_dir, account_id, region))
+    if args.template_bucket:
+        s3 = get_client('s3', endpoint_url=args.s3_endpoint_url)
+        template_store = TemplateStore(s3, args.template_bucket, args.template_prefix, args.s3_endpoint_url)
+    try:
+        overrides = region_parameters(region)
+    except (ClientError, ValueError) as e:
+        logger.error(f"Aborting pipeline: cannot determine the Availability Zones of {region}: {e}")
+        sys.exit(1)
+    if args.gwlb_service_name:
+        overrides["ServiceName"] = args.gwlb_service_name
+    # A drift check deploys nothing, so it needs no certificate
+    if args.alb_certificate and not args.drift:
+        certificate_arn = ensure_certificate(CERT_FILE, KEY_FILE, args.renewal_days)
+        if not certificate_arn:
+            logger.error("Aborting pipeline: ALB certificate is unavailable.")
             sys.exit(1)
+        overrides["ACMCertificateArn"] = certificate_arn
+    stack_definitions = override_parameters(stack_definitions, overrides)
+    graph = build_dependency_graph(stack_definitions)
+    managed_stacks = [s["name"] for s in stack_definitions]
 
-        outputs = get_stack_outputs(stack["name"])
-        for key in stack.get("outputs", []):
-            if key in outputs:
-                collected_outputs[key] = outputs[key]
-            else:
-                logger.warning(f"Output '{key}' not found in {stack['name']}")
-
-        # === DERIVED OUTPUTS after LZvpcStack ===
-        if stack["name"] == "LZvpcStack":
-            # Build ALBSubnetIds
-            alb_required = ["ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id"]
-            if all(k in collected_outputs for k in alb_required):
-                collected_outputs["ALBSubnetIds"] = ",".join(collected_outputs[k] for k in alb_required)
-            else:
-                missing = [k for k in alb_required if k not in collected_outputs]
-                logger.error(f"Missing ALB subnet IDs: {', '.join(missing)}")
+    if args.tenants:
+        try:
+            tenants = load_tenant_manifest(args.tenants)
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid tenant manifest {args.tenants}: {e}")
+            sys.exit(1)
+        for tenant in tenants:
+            for key, value in overrides.items():
+                tenant.setdefault("parameters", {}).setdefault(key, value)
+        tenant_graph = tenant_dependency_graph(tenants)
+        graph.update(tenant_graph)
+        managed_stacks = list(tenant_graph)
+    # The snapshot sweep keeps only the stacks this run manages, not every stack in the account
+    prefixes = [t["prefix"] for t in tenants] if args.tenants else [DEFAULT_STACK_PREFIX]
+    stack_snapshot.limit_to([parent_stack_name(p) for p in prefixes] if args.nested else managed_stacks)
+
+    try:
+        drifted = None
+        if args.drift or args.update_drifted:
+            drifted = check_drift(managed_stacks, args.max_workers)
+            if drifted is None:
+                logger.error("Aborting pipeline: drift detection failed.")
                 sys.exit(1)
+            if not args.update_drifted or not drifted:
+                logger.info(f"Drifted stacks: {', '.join(sorted(drifted)) or 'none'}")
+                sys.exit(0)
+            # Only the drifted stacks are selected, and they are pushed through the update path
+            args.force = True
 
-            # Build APIGW SubnetIds
-            apigw_required = ["APIGWSubnet1Id", "APIGWSubnet2Id"]
-            if all(k in collected_outputs for k in apigw_required):
-                collected_outputs["APIGWSubnetIds"] = ",".join(collected_outputs[k] for k in apigw_required)
-            else:
-                missing = [k for k in apigw_required if k not in collected_outputs]
-                logger.error(f"Missing API Gateway subnet IDs: {', '.join(missing)}")
+        if not preflight(stack_definitions, args.cache_dir, args.max_workers):
+            logger.error("Aborting pipeline: pre-flight validation failed.")
+            sys.exit(1)
+
+        if args.tenants:
+            # One token bucket per service, shared by every tenant
+            attach_rate_limiter(cf, TokenBucket(args.api_rate, args.api_burst))
+            attach_rate_limiter(ec2, TokenBucket(args.api_rate, args.api_burst))
+
+            results = deploy_tenants(tenants, args.max_tenants, args.max_workers, cache, run_state, drifted)
+            if not all(r["success"] for r in results):
+                logger.error("Aborting pipeline due to failed tenant(s).")
                 sys.exit(1)
 
-            # Build SFTPSubnetIds
-            sftp_required = ["SFTPSubnet1Id", "SFTPSubnet2Id", "SFTPSubnet3Id"]
-            if all(k in collected_outputs for k in sftp_required):
-                collected_outputs["SFTPSubnetIds"] = ",".join(collected_outputs[k] for k in sftp_required)
-            else:
-                missing = [k for k in sftp_required if k not in collected_outputs]
-                logger.error(f"Missing SFTP subnet IDs: {', '.join(missing)}")
+            endpoints_by_vpc = {}
+            for r in results:
+                endpoints_by_vpc.update(gwlb_endpoints_by_vpc(r["outputs"]))
+        elif args.nested:
+            nested = nested_definitions(stack_definitions)
+            if nested is None:
+                logger.error("Aborting pipeline: templates could not be staged.")
                 sys.exit(1)
+            graph = build_dependency_graph(nested)
+            plans = plan_change_sets(nested, args.max_workers, cache) if args.change_sets else None
 
-            # Build GWLBSubnetIds
-            gwlb_required = ["GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id"]
-            if all(k in collected_outputs for k in gwlb_required):
-                collected_outputs["GWLBSubnetIds"] = ",".join(collected_outputs[k] for k in gwlb_required)
-            else:
-                missing = [k for k in gwlb_required if k not in collected_outputs]
-                logger.error(f"Missing GWLB subnet IDs: {', '.join(missing)}")
+            collected_outputs = {}
+            if not deploy_all(nested, collected_outputs, cache=cache, plans=plans, run_state=run_state):
+                logger.error("Aborting pipeline due to failed parent stack.")
+                sys.exit(1)
+            endpoints_by_vpc = gwlb_endpoints_by_vpc(collected_outputs)
+        else:
+            try:
+                selected = drifted or select_stacks(graph, args.only, args.resume_from, run_state.completed())
+            except ValueError as e:
+                logger.error(str(e))
                 sys.exit(1)
 
-            # Enable DNS attributes
-            set_vpc_dns_attributes(collected_outputs["VpcId"])
+            collected_outputs = {}
+            if selected is not None:
+                logger.info(f"Deploying only: {', '.join(s['name'] for s in stack_definitions if s['name'] in selected)}")
+                collected_outputs = upstream_outputs(stack_definitions, graph, selected, run_state)
+                if collected_outputs is None:
+                    logger.error("Aborting pipeline: outputs of upstream stacks are unavailable.")
+                    sys.exit(1)
 
-            logger.info("\n--- Derived Outputs after LZvpcStack ---")
-            for k in ["ALBSubnetIds", "APIGWSubnetIds", "SFTPSubnetIds", "GWLBSubnetIds"]:
-                logger.info(f"{k}: {collected_outputs[k]}")
+            targets = [s for s in stack_definitions if selected is None or s["name"] in selected]
+            plans = plan_change_sets(targets, args.max_workers, cache) if args.change_sets else None
 
-# ... validate GWLB Endpoint ...
-try:
-    result = subprocess.run(
-        ["python", "validate_gwlb_endpoint.py"],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-    logger.info("[validate_gwlb_endpoint.py] Output:\n" + result.stdout)
-    if result.stderr:
-        logger.warning("[validate_gwlb_endpoint.py] Errors:\n" + result.stderr)
-except subprocess.CalledProcessError as e:
-    logger.error(f"Error running validate_gwlb_endpoint.py: {e}")
-    logger.error(f"Stdout: {e.stdout}")
-    logger.error(f"Stderr: {e.stderr}")
-    sys.exit(1)
\ No newline at end of file
+            if not deploy_all(stack_definitions, collected_outputs, max_workers=args.max_workers, cache=cache,
+                              plans=plans, only=selected, run_state=run_state):
+                logger.error("Aborting pipeline due to failed stack. Fix it and rerun with --resume-from <stack>.")
+                sys.exit(1)
+
+            # Stacks outside a partial run contribute their recorded or live outputs
+            if selected is not None:
+                collected_outputs = {**skipped_outputs(stack_definitions, selected, run_state), **collected_outputs}
+            endpoints_by_vpc = gwlb_endpoints_by_vpc(collected_outputs)
+
+        # ... validate GWLB Endpoint ...
+        if not validate_gwlb_endpoint(endpoints_by_vpc, args.max_workers):
+            sys.exit(1)
+
+        if args.update_drifted and not drift_resolved(sorted(drifted), args.max_workers):
+            sys.exit(1)
+    finally:
+        report_timings(graph, args.trace_file, args.metrics_file)
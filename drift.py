@@ -0,0 +1,109 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from scheduler import DEFAULT_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+POLL_DELAY = 5
+DEFAULT_TIMEOUT = 900
+# Drift detection is only possible on stacks that are not mid-operation or failed
+CHECKABLE_STATUSES = ("CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE")
+DRIFTED_RESOURCE_STATUSES = ["MODIFIED", "DELETED"]
+
+
+def start_drift_detections(cf, stack_names, pool):
+    """Start drift detection on every stack at once and return {stack name: detection ID}."""
+    def start(stack_name):
+        try:
+            return cf.detect_stack_drift(StackName=stack_name)['StackDriftDetectionId']
+        except ClientError as e:
+            logger.error(f"Failed to start drift detection for {stack_name}: {e}")
+            return None
+
+    detection_ids = zip(stack_names, pool.map(start, stack_names))
+    return {name: detection_id for name, detection_id in detection_ids if detection_id}
+
+
+def wait_for_drift_detections(cf, detection_ids, pool, timeout=DEFAULT_TIMEOUT):
+    """Poll all detections together until each one has finished.
+
+    Returns {stack name: describe_stack_drift_detection_status response}, with
+    None for detections that could not be read or did not finish in time.
+    """
+    def status(detection_id):
+        try:
+            return cf.describe_stack_drift_detection_status(StackDriftDetectionId=detection_id)
+        except ClientError as e:
+            logger.error(f"Failed to read drift detection {detection_id}: {e}")
+            return None
+
+    pending = dict(detection_ids)
+    finished = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        names = list(pending)
+        for name, response in zip(names, pool.map(status, [pending[n] for n in names])):
+            if response is None or response['DetectionStatus'] != 'DETECTION_IN_PROGRESS':
+                finished[name] = response
+                del pending[name]
+        if not pending:
+            break
+        if time.monotonic() > deadline:
+            logger.error(f"Timed out after {timeout}s waiting for drift detection of {', '.join(pending)}")
+            finished.update({name: None for name in pending})
+            break
+        time.sleep(POLL_DELAY)
+    return finished
+
+
+def drifted_resources(cf, stack_name):
+    """Return the resource drifts of a stack, limited to modified and deleted resources."""
+    drifts = []
+    kwargs = {"StackName": stack_name, "StackResourceDriftStatusFilters": DRIFTED_RESOURCE_STATUSES}
+    while True:
+        response = cf.describe_stack_resource_drifts(**kwargs)
+        drifts.extend(response['StackResourceDrifts'])
+        if not response.get('NextToken'):
+            return drifts
+        kwargs['NextToken'] = response['NextToken']
+
+
+def detect_drift(cf, stack_names, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """Detect drift on all stacks in one parallel sweep.
+
+    Returns {stack name: {"status", "reason", "resources"}} where status is the
+    StackDriftStatus (DRIFTED, IN_SYNC, ...) or DETECTION_FAILED, and resources
+    lists the drifted resources of DRIFTED stacks.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        detection_ids = start_drift_detections(cf, stack_names, pool)
+        finished = wait_for_drift_detections(cf, detection_ids, pool, timeout)
+        drifted = [name for name, r in finished.items() if r and r.get('StackDriftStatus') == 'DRIFTED']
+        resources = dict(zip(drifted, pool.map(lambda name: drifted_resources(cf, name), drifted)))
+
+    results = {}
+    for name in stack_names:
+        response = finished.get(name)
+        if response is None:
+            results[name] = {"status": "DETECTION_FAILED", "reason": "Drift detection did not complete", "resources": []}
+            continue
+        status = response.get('StackDriftStatus', 'UNKNOWN')
+        # A detection can fail for some resources and still find drift in others
+        if response['DetectionStatus'] == 'DETECTION_FAILED' and status != 'DRIFTED':
+            status = 'DETECTION_FAILED'
+        results[name] = {"status": status, "reason": response.get('DetectionStatusReason', ''),
+                         "resources": resources.get(name, [])}
+    return results
+
+
+def format_drift_report(stack_name, resources):
+    """Render drifted resources as one line each, with the drifted property paths."""
+    lines = [f"Drift in {stack_name}: {len(resources)} resource(s)"]
+    for drift in resources:
+        paths = ", ".join(d['PropertyPath'] for d in drift.get('PropertyDifferences', []))
+        line = f"  {drift['StackResourceDriftStatus']:<9} {drift['ResourceType']:<40} {drift['LogicalResourceId']}"
+        lines.append(f"{line}  ({paths})" if paths else line)
+    return "\n".join(lines)
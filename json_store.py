@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStore:
+    """Thread-safe JSON object kept in one file, rewritten atomically on every change.
+
+    A missing file starts an empty store; an unreadable one is ignored with a
+    warning naming the store's description.
+    """
+
+    def __init__(self, path, description="JSON store"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable {description} {path}: {e}")
+
+    def get(self, key):
+        """Return the value stored under key, or None."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def keys(self):
+        """Return the stored keys as a set."""
+        with self._lock:
+            return set(self._entries)
+
+    def set(self, key, value):
+        """Store a value and persist the file."""
+        with self._lock:
+            self._entries[key] = value
+            self._save()
+
+    def pop(self, key):
+        """Remove a key, persisting the file only if it was present."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
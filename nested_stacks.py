@@ -0,0 +1,85 @@
+import json
+import re
+from scheduler import build_dependency_graph, provided_output_keys
+
+# --- Constants ---
+PARENT_STACK_SUFFIX = "parentStack"
+PARENT_TEMPLATE_DESCRIPTION = "Generated parent stack: one nested stack per landing zone template."
+
+
+def parent_stack_name(prefix):
+    """Name of the parent stack holding a stack set, e.g. LZparentStack."""
+    return f"{prefix}{PARENT_STACK_SUFFIX}"
+
+
+def logical_id(stack_name):
+    """Nested stack resource ID for a stack name; logical IDs are alphanumeric only."""
+    return re.sub(r"[^A-Za-z0-9]", "", stack_name)
+
+
+def _output_references(stack_definitions):
+    """Map each provided output key to the template expression that yields its value."""
+    references = {}
+    for stack in stack_definitions:
+        resource = logical_id(stack["name"])
+        for key in stack.get("outputs", []):
+            references[key] = {"Fn::GetAtt": [resource, f"Outputs.{key}"]}
+        # Derived outputs join several outputs into one comma-separated value
+        for key, parts in stack.get("derived_outputs", {}).items():
+            references[key] = {"Fn::Join": [",", [{"Fn::GetAtt": [resource, f"Outputs.{k}"]} for k in parts]]}
+    return references
+
+
+def parent_template(stack_definitions, template_urls):
+    """Compile stack definitions into one parent template of AWS::CloudFormation::Stack resources.
+
+    template_urls maps each template file name to its staged S3 URL. The
+    parameters_from_outputs wiring becomes GetAtt/Join references, so
+    CloudFormation orders and parallelises the nested stacks itself. Every
+    output a stack provides, derived ones included, is re-exported by the
+    parent. Returns the template as a dict.
+    """
+    # Rejects missing producers and cycles the same way the client-side scheduler would
+    build_dependency_graph(stack_definitions)
+    references = _output_references(stack_definitions)
+
+    resources = {}
+    for stack in stack_definitions:
+        parameters = {p["ParameterKey"]: p["ParameterValue"] for p in stack.get("parameters", [])}
+        for p in stack.get("parameters_from_outputs", []):
+            if "output_key" in p:
+                parameters[p["parameter_key"]] = references[p["output_key"]]
+            else:
+                parameters[p["parameter_key"]] = {"Fn::Join": [",", [references[k] for k in p["output_keys"]]]}
+        resources[logical_id(stack["name"])] = {
+            "Type": "AWS::CloudFormation::Stack",
+            "Properties": {"TemplateURL": template_urls[stack["template"]], "Parameters": parameters},
+        }
+
+    outputs = {}
+    for stack in stack_definitions:
+        for key in provided_output_keys(stack):
+            outputs[key] = {"Value": references[key]}
+
+    return {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Description": PARENT_TEMPLATE_DESCRIPTION,
+        "Resources": resources,
+        "Outputs": outputs,
+    }
+
+
+def parent_stack_definition(stack_definitions, prefix, template_urls):
+    """Stack definition that deploys the whole stack set as one parent stack.
+
+    The generated template travels in "template_body"; its outputs are every
+    output of the nested stacks, so downstream code sees the same keys.
+    """
+    name = parent_stack_name(prefix)
+    return {
+        "name": name,
+        "template": f"{name}.json",
+        "template_body": json.dumps(parent_template(stack_definitions, template_urls), indent=2, sort_keys=True),
+        "enable_vpc_dns": any(s.get("enable_vpc_dns") for s in stack_definitions),
+        "outputs": [key for s in stack_definitions for key in provided_output_keys(s)],
+    }
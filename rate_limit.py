@@ -0,0 +1,42 @@
+import threading
+import time
+
+# --- Constants ---
+DEFAULT_API_RATE = 5.0
+DEFAULT_API_BURST = 10
+
+
+class TokenBucket:
+    """Thread-safe token bucket that blocks callers until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until the bucket has refilled enough."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def attach_rate_limiter(client, bucket):
+    """Make every HTTP request sent by a boto3 client take a token from `bucket`.
+
+    Hooking before-send means botocore retries are rate limited as well.
+    """
+    def take_token(**kwargs):
+        bucket.acquire()
+
+    client.meta.events.register('before-send', take_token)
+    return client
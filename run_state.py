@@ -0,0 +1,35 @@
+import os
+from json_store import JsonStore
+
+
+def run_state_path(state_dir, account_id, region):
+    """Return the run-state file used for one account/region pair."""
+    return os.path.join(state_dir, f"run-state-{account_id}-{region}.json")
+
+
+class RunState(JsonStore):
+    """Outputs, including derived ones, of every stack that last deployed successfully.
+
+    Lets a later run deploy a subset of the stacks (--only, --resume-from)
+    without re-running or re-describing the stacks upstream of it.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, "run state")
+
+    def completed(self):
+        """Names of the stacks with recorded outputs."""
+        return self.keys()
+
+    def outputs(self, stack_name):
+        """Return the recorded outputs of a stack, or None if it has not completed."""
+        outputs = self.get(stack_name)
+        return dict(outputs) if outputs is not None else None
+
+    def record(self, stack_name, outputs):
+        """Store the outputs of a successfully deployed stack and persist the file."""
+        self.set(stack_name, dict(outputs))
+
+    def forget(self, stack_name):
+        """Drop a stack that failed, so --resume-from deploys it again."""
+        self.pop(stack_name)
@@ -0,0 +1,140 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_MAX_WORKERS = 4
+
+
+def required_output_keys(stack_def):
+    """Return the output keys a stack consumes through parameters_from_outputs."""
+    keys = []
+    for p in stack_def.get("parameters_from_outputs", []):
+        if "output_key" in p:
+            keys.append(p["output_key"])
+        elif "output_keys" in p:
+            keys.extend(p["output_keys"])
+    return keys
+
+
+def provided_output_keys(stack_def):
+    """Return the output keys a stack contributes, including derived ones."""
+    return list(stack_def.get("outputs", [])) + list(stack_def.get("derived_outputs", {}))
+
+
+def build_dependency_graph(stack_definitions):
+    """Map each stack name to the set of stack names whose outputs it consumes."""
+    producers = {}
+    for stack in stack_definitions:
+        for key in provided_output_keys(stack):
+            producers[key] = stack["name"]
+
+    graph = {}
+    for stack in stack_definitions:
+        deps = set()
+        for key in required_output_keys(stack):
+            if key not in producers:
+                raise ValueError(f"No stack provides output '{key}' required by {stack['name']}")
+            deps.add(producers[key])
+        deps.discard(stack["name"])
+        graph[stack["name"]] = deps
+
+    _check_acyclic(graph)
+    return graph
+
+
+def reverse_dependency_graph(graph):
+    """Map each stack name to the set of stack names that consume its outputs."""
+    reverse = {name: set() for name in graph}
+    for name, deps in graph.items():
+        for dep in deps:
+            reverse.setdefault(dep, set()).add(name)
+    return reverse
+
+
+def dependency_closure(graph, names):
+    """Return names plus every stack they depend on, directly or transitively."""
+    closure = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in closure:
+            closure.add(name)
+            pending.extend(graph.get(name, ()))
+    return closure
+
+
+def dependent_closure(graph, names):
+    """Return names plus every stack that depends on them, directly or transitively."""
+    return dependency_closure(reverse_dependency_graph(graph), names)
+
+
+def _check_acyclic(graph):
+    """Raise ValueError if the dependency graph contains a cycle."""
+    visiting, visited = set(), set()
+
+    def visit(name, path):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle detected: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dep in sorted(graph.get(name, ())):
+            visit(dep, path + [name])
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in graph:
+        visit(name, [])
+
+
+def run_graph(names, is_ready, run_node, on_success=None, max_workers=DEFAULT_MAX_WORKERS, fail_fast=True,
+              executor=None):
+    """Run run_node(name) on a bounded pool as soon as is_ready(name) holds.
+
+    run_node returns a result, or None/False on failure. on_success(name, result)
+    is called from the scheduling thread, so it may update shared state that
+    is_ready inspects. With fail_fast, no new nodes are started after a failure.
+    Passing an executor shares its workers (and its limit) between several
+    graphs; max_workers is then ignored.
+
+    Returns a (succeeded, failed, not_started) tuple of name lists.
+    """
+    pending = list(names)
+    running = {}
+    succeeded, failed = [], []
+
+    own_pool = executor is None
+    pool = ThreadPoolExecutor(max_workers=max_workers) if own_pool else executor
+    try:
+        while True:
+            if not (failed and fail_fast):
+                for name in list(pending):
+                    if is_ready(name):
+                        pending.remove(name)
+                        running[pool.submit(run_node, name)] = name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Unhandled error while processing {name}: {e}")
+                    result = None
+
+                if result is None or result is False:
+                    failed.append(name)
+                else:
+                    succeeded.append(name)
+                    if on_success:
+                        on_success(name, result)
+    finally:
+        if own_pool:
+            pool.shutdown(wait=True)
+
+    return succeeded, failed, pending
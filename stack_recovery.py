@@ -0,0 +1,111 @@
+import logging
+import random
+import time
+from datetime import timedelta
+from botocore.exceptions import ClientError
+from stack_waiter import CLOCK_SKEW, operation_start, wait_for_stack
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# What to do with a stack found in a status the pipeline cannot create or update from
+RECOVERY_ACTIONS = {
+    "CREATE_FAILED": "recreate",
+    "ROLLBACK_COMPLETE": "recreate",
+    "ROLLBACK_FAILED": "recreate",
+    "DELETE_FAILED": "recreate",
+    "REVIEW_IN_PROGRESS": "recreate",
+    "UPDATE_ROLLBACK_FAILED": "continue_rollback",
+}
+MAX_RECOVERY_ROUNDS = 3
+TRANSIENT_ERRORS = ("Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException",
+                    "InternalFailure", "ServiceUnavailable", "RequestTimeout")
+MAX_ATTEMPTS = 5
+BASE_DELAY = 2
+MAX_DELAY = 60
+
+
+def recovery_action(status):
+    """Return "recreate", "continue_rollback", "wait" or None for a stack status."""
+    if status in RECOVERY_ACTIONS:
+        return RECOVERY_ACTIONS[status]
+    if status and status.endswith("_IN_PROGRESS"):
+        return "wait"
+    return None
+
+
+def with_backoff(call, description, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """Run call(), retrying transient API errors with exponential backoff and full jitter.
+
+    Complements botocore's own retries: those give up within seconds, this
+    outlasts longer throttling bursts. Other errors are raised immediately.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except ClientError as e:
+            if e.response['Error']['Code'] not in TRANSIENT_ERRORS or attempt + 1 == max_attempts:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"Transient error during {description} ({e.response['Error']['Code']}); "
+                           f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _wait_in_progress(cf, stack, on_event=None):
+    """Wait for an operation started by someone else; returns its final status."""
+    started_at = stack.get('DeletionTime') or stack.get('LastUpdatedTime') or stack['CreationTime']
+    logger.info(f"Stack {stack['StackName']} is {stack['StackStatus']}; waiting for it to finish...")
+    # Server timestamps on both sides: the cutoff comes from the stack's own times
+    return wait_for_stack(cf, stack['StackId'], started_at - timedelta(seconds=CLOCK_SKEW), on_event=on_event,
+                          deleting=stack['StackStatus'].startswith('DELETE_'))
+
+
+def _recreate(cf, stack, on_event=None):
+    """Delete a stack that cannot be updated, so it can be created again."""
+    logger.warning(f"Stack {stack['StackName']} is {stack['StackStatus']}; deleting it so it can be recreated.")
+    since, token = operation_start()
+    with_backoff(lambda: cf.delete_stack(StackName=stack['StackId'], ClientRequestToken=token),
+                 f"delete of {stack['StackName']}")
+    return wait_for_stack(cf, stack['StackId'], since, token, on_event=on_event, deleting=True)
+
+
+def _continue_rollback(cf, stack, on_event=None):
+    """Finish a rollback that failed, leaving the stack updatable again."""
+    logger.warning(f"Stack {stack['StackName']} is {stack['StackStatus']}; continuing the update rollback.")
+    since, token = operation_start()
+    with_backoff(lambda: cf.continue_update_rollback(StackName=stack['StackId'], ClientRequestToken=token),
+                 f"rollback of {stack['StackName']}")
+    return wait_for_stack(cf, stack['StackId'], since, token, on_event=on_event)
+
+
+def recover_stack(cf, describe, stack_name, on_event=None):
+    """Bring a stack into a status the pipeline can create or update from.
+
+    describe(stack_name) returns the current describe_stacks entry, or None
+    once the stack is gone. Returns the resulting status, None if the stack
+    no longer exists (create it), or False if recovery failed.
+    """
+    for _ in range(MAX_RECOVERY_ROUNDS):
+        stack = describe(stack_name)
+        if stack is None:
+            return None
+        action = recovery_action(stack['StackStatus'])
+        if action is None:
+            return stack['StackStatus']
+        try:
+            if action == "wait":
+                status = _wait_in_progress(cf, stack, on_event)
+            elif action == "recreate":
+                status = _recreate(cf, stack, on_event)
+            else:
+                status = _continue_rollback(cf, stack, on_event)
+        except ClientError as e:
+            logger.error(f"Failed to recover stack {stack_name} from {stack['StackStatus']}: {e}")
+            return False
+        if status is None:
+            return False
+        logger.info(f"Stack {stack_name} recovered from {stack['StackStatus']} to {status}")
+
+    logger.error(f"Stack {stack_name} did not reach a deployable status after {MAX_RECOVERY_ROUNDS} recovery rounds")
+    return False
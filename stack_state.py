@@ -0,0 +1,94 @@
+import logging
+import threading
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+class StackSnapshot:
+    """In-memory view of stack status and outputs.
+
+    Stacks are loaded with one paginated describe_stacks sweep on first
+    use; afterwards only stacks that were touched are refreshed. Once
+    limited to the managed stack names, the sweep keeps only those and stops
+    as soon as all of them were seen; other stacks are described one by one
+    when asked for.
+    """
+
+    def __init__(self, cf, stack_names=None):
+        self.cf = cf
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stacks = None
+        self._stack_names = set(stack_names) if stack_names else None
+        self._described = set()
+
+    def limit_to(self, stack_names):
+        """Only load these stacks in the initial sweep; call before first use."""
+        self._stack_names = set(stack_names)
+
+    def load(self):
+        """Load the live stacks in the account/region in one paginated sweep."""
+        wanted = self._stack_names
+        stacks = {}
+        paginator = self.cf.get_paginator('describe_stacks')
+        for page in paginator.paginate():
+            for stack in page['Stacks']:
+                if stack['StackStatus'] != 'DELETE_COMPLETE' and (wanted is None or stack['StackName'] in wanted):
+                    stacks[stack['StackName']] = stack
+            if wanted is not None and wanted <= stacks.keys():
+                break
+        with self._lock:
+            self._stacks = stacks
+        logger.info(f"Loaded state of {len(stacks)} stack(s).")
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self._stacks is None:
+                self.load()
+
+    def get(self, stack_name):
+        """Return the cached describe_stacks entry for a stack, or None."""
+        self._ensure_loaded()
+        with self._lock:
+            unknown = (self._stack_names is not None and stack_name not in self._stack_names
+                       and stack_name not in self._described)
+        if unknown:
+            self.refresh(stack_name)
+        with self._lock:
+            return self._stacks.get(stack_name)
+
+    def status(self, stack_name):
+        """Return the cached status of a stack, or None if it does not exist."""
+        stack = self.get(stack_name)
+        return stack['StackStatus'] if stack else None
+
+    def outputs(self, stack_name):
+        """Return the cached outputs of a stack as a dict."""
+        stack = self.get(stack_name)
+        return {o['OutputKey']: o['OutputValue'] for o in (stack or {}).get('Outputs', [])}
+
+    def refresh(self, stack_name):
+        """Re-describe a single stack after it was created, updated or deleted."""
+        self._ensure_loaded()
+        try:
+            response = self.cf.describe_stacks(StackName=stack_name)
+            stack = response['Stacks'][0]
+        except ClientError as e:
+            if 'does not exist' not in str(e):
+                logger.error(f"Failed to refresh state of stack {stack_name}: {e}")
+                return
+            stack = None
+
+        with self._lock:
+            self._described.add(stack_name)
+            if stack and stack['StackStatus'] != 'DELETE_COMPLETE':
+                self._stacks[stack_name] = stack
+            else:
+                self._stacks.pop(stack_name, None)
+
+    def discard(self, stack_name):
+        """Forget a stack that is known to be deleted."""
+        self._ensure_loaded()
+        with self._lock:
+            self._stacks.pop(stack_name, None)
@@ -0,0 +1,116 @@
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+MIN_DELAY = 2
+MAX_DELAY = 20
+BACKOFF = 1.5
+DEFAULT_TIMEOUT = 3600
+CLOCK_SKEW = 5
+THROTTLING_ERRORS = ("Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException")
+
+
+def operation_start():
+    """Return (since, request_token) for a stack operation that is about to start.
+
+    Pass the token as ClientRequestToken to the operation and both values to
+    wait_for_stack so events of earlier operations are never mistaken for it.
+    Every event of the operation carries the token, so the waiter relies on it
+    alone; since only bounds waits that have no token.
+    """
+    since = datetime.now(timezone.utc) - timedelta(seconds=CLOCK_SKEW)
+    return since, f"lz-{uuid.uuid4()}"
+
+
+def _new_events(cf, stack_name, since, seen, request_token=None):
+    """Return events not seen before, oldest first.
+
+    With a request_token, only events of that operation are returned; the
+    server's own ordering is used, not timestamps compared to the local clock.
+    Otherwise events older than `since` are skipped.
+    """
+    new = []
+    kwargs = {"StackName": stack_name}
+    while True:
+        response = cf.describe_stack_events(**kwargs)
+        for event in response['StackEvents']:
+            # Events are returned newest first, so stop at the first known one
+            if request_token:
+                older = event.get('ClientRequestToken') != request_token
+            else:
+                older = event['Timestamp'] < since
+            if event['EventId'] in seen or older:
+                seen.update(e['EventId'] for e in new)
+                return list(reversed(new))
+            new.append(event)
+        if not response.get('NextToken'):
+            break
+        kwargs['NextToken'] = response['NextToken']
+    seen.update(e['EventId'] for e in new)
+    return list(reversed(new))
+
+
+def _log_event(event):
+    reason = event.get('ResourceStatusReason')
+    message = (f"{event['StackName']}: {event['LogicalResourceId']} "
+               f"({event['ResourceType']}) {event['ResourceStatus']}")
+    if reason:
+        message += f" - {reason}"
+    if event['ResourceStatus'].endswith('_FAILED'):
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+
+def wait_for_stack(cf, stack_name, since, request_token=None, timeout=DEFAULT_TIMEOUT,
+                   min_delay=MIN_DELAY, max_delay=MAX_DELAY, on_event=None, deleting=False):
+    """Stream stack events until the stack reaches a terminal status.
+
+    Polls describe_stack_events quickly while events are arriving and backs
+    off while the stack is quiet or the API is throttling. Returns the final
+    stack status, or None on timeout. A stack that disappears counts as
+    'DELETE_COMPLETE' when deleting, and raises the ClientError otherwise.
+    on_event, if given, is called with every new event.
+    """
+    seen = set()
+    started = False
+    delay = min_delay
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            events = _new_events(cf, stack_name, since, seen, request_token)
+        except ClientError as e:
+            if e.response['Error']['Code'] in THROTTLING_ERRORS:
+                delay = min(max_delay, delay * 2)
+                logger.warning(f"Throttled while waiting for {stack_name}; retrying in {delay:.0f}s")
+                time.sleep(delay * random.uniform(1, 1.5))
+                continue
+            if deleting and 'does not exist' in str(e):
+                return 'DELETE_COMPLETE'
+            raise
+
+        for event in events:
+            _log_event(event)
+            if on_event:
+                on_event(event)
+            if event.get('PhysicalResourceId') != event['StackId']:
+                continue
+            # Only a terminal status that follows this operation's own start counts
+            status = event['ResourceStatus']
+            if status.endswith('_IN_PROGRESS'):
+                started = True
+            elif started:
+                return status
+
+        delay = min_delay if events else min(max_delay, delay * BACKOFF)
+        time.sleep(delay)
+
+    logger.error(f"Timed out after {timeout}s waiting for stack {stack_name}")
+    return None
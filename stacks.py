@@ -0,0 +1,199 @@
+import copy
+import ipaddress
+
+# --- Constants ---
+DEFAULT_STACK_PREFIX = "LZ"
+# The region the parameters below were written for; deployment.py derives Region and AZs for others
+DEFAULT_REGION = "ap-southeast-1"
+AZ_COUNT = 3
+# Subnets are 8 bits smaller than their VPC; an ALB needs subnets of at least /27
+SUBNET_PREFIX_OFFSET = 8
+MAX_SUBNET_PREFIX_LENGTH = 27
+SUBNET_CIDR_PARAMETERS = [
+    "PublicSubnetCidrs", "PrivateSubnetCidrs", "ALBSubnetCidrs",
+    "GWLBSubnetCidrs", "SFTPSubnetCidrs", "APIGWSubnetCidrs"
+]
+
+# --- Stack deployment definitions ---
+stack_definitions = [
+    {
+        "name": "LZvpcStack",
+        "template": "vpc.yaml",
+        "enable_vpc_dns": True,
+        "parameters": [
+            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
+            {"ParameterKey": "Owner", "ParameterValue": "YourName"},
+            {"ParameterKey": "BusinessUnit", "ParameterValue": "Cloud"},
+            {"ParameterKey": "VpcCidr", "ParameterValue": "10.10.0.0/16"},
+            {"ParameterKey": "Region", "ParameterValue": DEFAULT_REGION},
+            {"ParameterKey": "AvailabilityZones", "ParameterValue": "ap-southeast-1a,ap-southeast-1b,ap-southeast-1c"},
+            {"ParameterKey": "PublicSubnetCidrs", "ParameterValue": "10.10.1.0/24,10.10.2.0/24,10.10.3.0/24"},
+            {"ParameterKey": "PrivateSubnetCidrs", "ParameterValue": "10.10.4.0/24,10.10.5.0/24,10.10.6.0/24"},
+            {"ParameterKey": "ALBSubnetCidrs", "ParameterValue": "10.10.7.0/24,10.10.8.0/24,10.10.9.0/24"},
+            {"ParameterKey": "GWLBSubnetCidrs", "ParameterValue": "10.10.10.0/24,10.10.11.0/24,10.10.12.0/24"},
+            {"ParameterKey": "SFTPSubnetCidrs", "ParameterValue": "10.10.13.0/24,10.10.14.0/24,10.10.15.0/24"},
+            {"ParameterKey": "APIGWSubnetCidrs", "ParameterValue": "10.10.16.0/24,10.10.17.0/24,10.10.18.0/24"}
+        ],
+        "outputs": [
+            "VpcId", "ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id",
+            "APIGWSubnet1Id", "APIGWSubnet2Id",
+            "GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id",
+            "SFTPSubnet1Id", "SFTPSubnet2Id", "SFTPSubnet3Id"
+        ],
+        "derived_outputs": {
+            "ALBSubnetIds": ["ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id"],
+            "APIGWSubnetIds": ["APIGWSubnet1Id", "APIGWSubnet2Id"],
+            "SFTPSubnetIds": ["SFTPSubnet1Id", "SFTPSubnet2Id", "SFTPSubnet3Id"],
+            "GWLBSubnetIds": ["GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id"]
+        }
+    },
+    {
+        "name": "LZwafStack",
+        "template": "waf.yaml",
+        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
+        "outputs": ["WebACLArn"]
+    },
+    {
+        "name": "LZvgwStack",
+        "template": "vgw.yaml",
+        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
+        "parameters_from_outputs": [
+            {"output_key": "VpcId", "parameter_key": "VpcId"}
+        ]
+    },
+    {
+        "name": "LZsgStack",
+        "template": "security-groups.yaml",
+        "parameters": [{"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}],
+        "parameters_from_outputs": [
+            {"output_key": "VpcId", "parameter_key": "VpcId"}
+        ],
+        "outputs": [
+            "ALBSecurityGroupId",
+            "TargetGroupSecurityGroupId",
+            "ApiGatewayEndpointSecurityGroupId",
+            "SFTPSecurityGroupId"
+        ]
+    },
+    {
+    "name": "LZalbStack",
+    "template": "alb.yaml",
+    "parameters": [
+        {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
+        {
+            "ParameterKey": "ACMCertificateArn",
+            "ParameterValue": "arn:aws:acm:ap-southeast-1:975050199901:certificate/054f77c3-aec0-488d-ab55-8a2b552c1c90"
+        }
+    ],
+    "parameters_from_outputs": [
+        {"output_key": "VpcId", "parameter_key": "VpcId"},
+        {
+            "output_keys": ["ALBSubnet1Id", "ALBSubnet2Id", "ALBSubnet3Id"],
+            "parameter_key": "ALBSubnetIds"
+        },
+        {"output_key": "ALBSecurityGroupId", "parameter_key": "ALBSecurityGroupId"},
+        {"output_key": "TargetGroupSecurityGroupId", "parameter_key": "TargetGroupSecurityGroupId"},
+        {"output_key": "WebACLArn", "parameter_key": "WAFWebACLArn"}
+    ],
+    "outputs": [
+        "ALBArn",
+        "ALBTargetGroupArn"
+    ]
+    },
+
+    {
+        "name": "LZgwlbeStack",
+        "template": "gwlb-endpoint.yaml",
+        "parameters": [
+            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"},
+            {"ParameterKey": "ServiceName", "ParameterValue": "com.amazonaws.vpce.ap-southeast-1.vpce-svc-0eaa5d68deb2856ba"}
+        ],
+        "parameters_from_outputs": [
+            {
+                "output_keys": ["GWLBSubnet1Id", "GWLBSubnet2Id", "GWLBSubnet3Id"],
+                "parameter_key": "SubnetIds"
+            },
+            {"output_key": "VpcId", "parameter_key": "VpcId"}
+        ],
+        "outputs": ["GWLBEId1", "GWLBEId2", "GWLBEId3"]
+    },
+    {
+        "name": "LZsftpStack",
+        "template": "sftp-endpoint.yaml",
+        "parameters": [
+            {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}
+        ],
+        "parameters_from_outputs": [
+            {"output_key": "VpcId", "parameter_key": "VpcId"},
+            {"output_key": "SFTPSubnetIds", "parameter_key": "SFTPSubnetIds"},
+            {"output_key": "SFTPSecurityGroupId", "parameter_key": "SecurityGroupId"}
+        ],
+        "outputs": ["SFTPVpcEndpointId"]
+    },
+{
+    "name": "LZs3VpcEndpointStack",
+    "template": "s3-vpc-endpoint.yaml", 
+    "parameters": [
+        {"ParameterKey": "ProjectName", "ParameterValue": "SaaS"}
+    ],
+    "parameters_from_outputs": [
+        {"output_key": "VpcId", "parameter_key": "VpcId"}
+    ],
+    "outputs": ["S3VpcEndpointId"]
+}
+]
+
+
+def subnet_cidrs(vpc_cidr, az_count=AZ_COUNT):
+    """Carve per-AZ subnet CIDRs out of a VPC range following the default layout.
+
+    The default 10.10.0.0/16 VPC uses /24 blocks 1-18 in the order of
+    SUBNET_CIDR_PARAMETERS; other ranges use the same positions scaled to
+    their size.
+    """
+    network = ipaddress.ip_network(vpc_cidr)
+    new_prefix = network.prefixlen + SUBNET_PREFIX_OFFSET
+    if new_prefix > MAX_SUBNET_PREFIX_LENGTH:
+        raise ValueError(f"VPC CIDR {vpc_cidr} is too small for the default subnet layout")
+
+    blocks = list(network.subnets(new_prefix=new_prefix))
+    cidrs = {}
+    for i, key in enumerate(SUBNET_CIDR_PARAMETERS):
+        start = 1 + i * az_count
+        cidrs[key] = ",".join(str(b) for b in blocks[start:start + az_count])
+    return cidrs
+
+def override_parameters(definitions, parameter_overrides):
+    """Return a copy of definitions with every matching static parameter set to its override."""
+    definitions = copy.deepcopy(definitions)
+    for stack in definitions:
+        for p in stack.get("parameters", []):
+            if p["ParameterKey"] in parameter_overrides:
+                p["ParameterValue"] = parameter_overrides[p["ParameterKey"]]
+    return definitions
+
+def tenant_project_name(prefix, parameter_overrides=None):
+    """ProjectName of a tenant: its override, or else its stack prefix."""
+    return (parameter_overrides or {}).get("ProjectName", prefix)
+
+def tenant_stack_definitions(prefix, vpc_cidr=None, parameter_overrides=None):
+    """Return a copy of stack_definitions renamed and parameterised for one tenant.
+
+    Stack names get `prefix` instead of the default LZ prefix, and so does
+    ProjectName unless overridden, keeping the templates' export names unique.
+    A VPC CIDR sets VpcCidr and the derived subnet CIDRs, and
+    parameter_overrides replaces the value of any matching static parameter
+    in every stack.
+    """
+    overrides = dict(parameter_overrides or {})
+    overrides["ProjectName"] = tenant_project_name(prefix, parameter_overrides)
+    if vpc_cidr:
+        overrides["VpcCidr"] = vpc_cidr
+        for key, value in subnet_cidrs(vpc_cidr).items():
+            overrides.setdefault(key, value)
+
+    definitions = override_parameters(stack_definitions, overrides)
+    for stack in definitions:
+        if stack["name"].startswith(DEFAULT_STACK_PREFIX):
+            stack["name"] = prefix + stack["name"][len(DEFAULT_STACK_PREFIX):]
+    return definitions
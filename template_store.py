@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import threading
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_TEMPLATE_PREFIX = "cfn-templates"
+
+
+def template_key(prefix, template_name, template_body):
+    """Content-addressed S3 key for a template body."""
+    digest = hashlib.sha256(template_body.encode("utf-8")).hexdigest()
+    return f"{prefix}/{digest}/{template_name}"
+
+
+class TemplateStore:
+    """Stages templates in S3 under content-hash keys and hands out TemplateURLs.
+
+    Each distinct template body is uploaded at most once: existing objects are
+    detected with head_object, and keys already seen in this process are not
+    checked again.
+    """
+
+    def __init__(self, s3, bucket, prefix=DEFAULT_TEMPLATE_PREFIX, endpoint_url=None):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._staged = set()
+
+    def object_url(self, key):
+        """URL CloudFormation (or a local S3 stand-in) can fetch the object from."""
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.s3.meta.region_name}.amazonaws.com/{key}"
+
+    def _exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def url_for(self, template_name, template_body):
+        """Upload the template if needed and return its TemplateURL."""
+        key = template_key(self.prefix, template_name, template_body)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key not in self._staged:
+                if self._exists(key):
+                    logger.info(f"Template {template_name} already staged at s3://{self.bucket}/{key}")
+                else:
+                    self.s3.put_object(Bucket=self.bucket, Key=key, Body=template_body.encode("utf-8"),
+                                       ContentType="application/x-yaml")
+                    logger.info(f"Uploaded template {template_name} to s3://{self.bucket}/{key}")
+                self._staged.add(key)
+        return self.object_url(key)
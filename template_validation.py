@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
+from json_store import JsonStore
+from scheduler import DEFAULT_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+VALIDATION_CACHE_FILE = "validated-templates.json"
+
+
+def template_hash(template_body):
+    """Content hash of a template body."""
+    return hashlib.sha256(template_body.encode("utf-8")).hexdigest()
+
+
+class ValidationCache(JsonStore):
+    """Declared parameters of templates that passed validate_template, keyed by content hash."""
+
+    def __init__(self, cache_dir):
+        super().__init__(os.path.join(cache_dir, VALIDATION_CACHE_FILE), "validation cache")
+
+    def lookup(self, digest):
+        return self.get(digest)
+
+    def record(self, digest, declared):
+        self.set(digest, declared)
+
+
+def _declared_parameters(response):
+    """Map declared parameter names to whether they have a default value."""
+    return {p['ParameterKey']: 'DefaultValue' in p for p in response.get('Parameters', [])}
+
+
+def validate_templates(cf, template_dir, template_source=None, cache=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Validate every template in template_dir concurrently.
+
+    template_source(template_name, body) returns the TemplateBody/TemplateURL
+    arguments; it defaults to the inline body. Returns a dict of template name
+    to declared parameters ({name: has_default}), or None if any template is
+    invalid. Pending validations are cancelled after the first failure.
+    """
+    templates = {}
+    for name in sorted(os.listdir(template_dir)):
+        if name.endswith((".yaml", ".yml", ".json")):
+            with open(os.path.join(template_dir, name), 'r') as f:
+                templates[name] = f.read()
+
+    declared, to_validate = {}, {}
+    for name, body in templates.items():
+        cached = cache.lookup(template_hash(body)) if cache else None
+        if cached is not None:
+            declared[name] = cached
+        else:
+            to_validate[name] = body
+    if declared:
+        logger.info(f"Templates unchanged since last validation: {', '.join(declared)}")
+
+    def validate(name):
+        body = to_validate[name]
+        source = template_source(name, body) if template_source else {"TemplateBody": body}
+        return _declared_parameters(cf.validate_template(**source))
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(validate, name): name for name in to_validate}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                declared[name] = future.result()
+            except CancelledError:
+                continue
+            except ClientError as e:
+                logger.error(f"Template validation failed for {name}: {e}")
+                failed = True
+                for pending in futures:
+                    pending.cancel()
+                continue
+            if cache:
+                cache.record(template_hash(to_validate[name]), declared[name])
+            logger.info(f"Template {name} is valid.")
+
+    return None if failed else declared
+
+
+def check_parameter_wiring(stack_definitions, declared):
+    """Check stack parameters against the parameters their templates declare.
+
+    Returns a list of problems: unknown templates, parameter keys the template
+    does not declare, keys supplied twice, and required parameters left unset.
+    """
+    problems = []
+    for stack in stack_definitions:
+        name, template = stack["name"], stack["template"]
+        if template not in declared:
+            problems.append(f"{name}: template {template} was not validated")
+            continue
+
+        keys = [p["ParameterKey"] for p in stack.get("parameters", [])]
+        keys += [p["parameter_key"] for p in stack.get("parameters_from_outputs", [])]
+        for key in sorted(set(keys)):
+            if key not in declared[template]:
+                problems.append(f"{name}: parameter {key} is not declared in {template}")
+            if keys.count(key) > 1:
+                problems.append(f"{name}: parameter {key} is supplied more than once")
+        for key, has_default in declared[template].items():
+            if not has_default and key not in keys:
+                problems.append(f"{name}: required parameter {key} of {template} is not supplied")
+    return problems
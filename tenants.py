@@ -0,0 +1,55 @@
+import json
+from cidr_planner import CidrIndex, check_tenant_cidr, landing_zone_cidrs, overlapping_tenants
+from scheduler import build_dependency_graph
+from stacks import stack_definitions, tenant_project_name, tenant_stack_definitions
+
+
+def load_tenant_manifest(path):
+    """Load a tenant manifest: a JSON list of {name, prefix, cidr, parameters} objects.
+
+    Every tenant needs its own VPC CIDR; cidr_planner.py --write allocates
+    the missing ones. Raises ValueError on an invalid manifest.
+    """
+    with open(path, 'r') as f:
+        tenants = json.load(f)
+
+    for tenant in tenants:
+        for key in ("name", "prefix"):
+            if not tenant.get(key):
+                raise ValueError(f"Tenant entry is missing '{key}': {tenant}")
+        if not tenant.get("cidr"):
+            raise ValueError(f"Tenant {tenant['name']} has no 'cidr'; allocate one with "
+                             f"cidr_planner.py --tenants {path} --write")
+    prefixes = [t["prefix"] for t in tenants]
+    if len(set(prefixes)) != len(prefixes):
+        raise ValueError("Tenant stack prefixes must be unique")
+
+    # ProjectName prefixes the templates' export names, which must be unique per account and region
+    taken = {p["ParameterValue"] for s in stack_definitions for p in s.get("parameters", [])
+             if p["ParameterKey"] == "ProjectName"}
+    for tenant in tenants:
+        project_name = tenant_project_name(tenant["prefix"], tenant.get("parameters"))
+        if project_name in taken:
+            raise ValueError(f"ProjectName '{project_name}' of tenant {tenant['name']} is already used "
+                             "by the landing zone or another tenant")
+        taken.add(project_name)
+
+    landing_zone = CidrIndex(landing_zone_cidrs())
+    for tenant in tenants:
+        check_tenant_cidr(tenant)
+        if landing_zone.overlaps(tenant["cidr"]):
+            raise ValueError(f"Tenant {tenant['name']} CIDR {tenant['cidr']} overlaps the landing zone VPC")
+
+    overlaps = overlapping_tenants(tenants)
+    if overlaps:
+        raise ValueError("Overlapping tenant CIDRs (plan them with cidr_planner.py): "
+                         + ", ".join(f"{a} and {b}" for a, b in overlaps))
+    return tenants
+
+
+def tenant_dependency_graph(tenants):
+    """Dependency graph of every tenant's stacks; each tenant's stacks only depend on its own."""
+    graph = {}
+    for tenant in tenants:
+        graph.update(build_dependency_graph(tenant_stack_definitions(tenant["prefix"])))
+    return graph
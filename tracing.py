@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SLOWEST_RESOURCES = 10
+
+
+class Tracer:
+    """Collects timing spans and exports them in Chrome trace event format.
+
+    The exported JSON loads in chrome://tracing, Perfetto and speedscope.
+    Phase spans land in the lane of the thread that ran them; CloudFormation
+    resource spans get one lane per stack.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._lanes = {}
+        self._resource_starts = {}
+
+    def _lane(self, label):
+        with self._lock:
+            if label not in self._lanes:
+                self._lanes[label] = len(self._lanes) + 1
+            return self._lanes[label]
+
+    def add_span(self, name, category, start, end, lane=None, **args):
+        """Record a finished span with wall-clock start/end times in seconds."""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": max(0, int((end - start) * 1e6)),
+            "pid": 1,
+            "tid": self._lane(lane or threading.current_thread().name),
+            "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name, category="phase", **args):
+        """Time the enclosed block as one span."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time.time(), **args)
+
+    def record_stack_event(self, event):
+        """Turn streamed stack events into per-resource spans (wait_for_stack on_event hook)."""
+        if event.get('PhysicalResourceId') == event['StackId']:
+            return
+        key = (event['StackId'], event['LogicalResourceId'])
+        status = event['ResourceStatus']
+        timestamp = event['Timestamp'].timestamp()
+        with self._lock:
+            if status.endswith('_IN_PROGRESS'):
+                self._resource_starts.setdefault(key, timestamp)
+                return
+            start = self._resource_starts.pop(key, None)
+        if start is not None:
+            self.add_span(f"{event['LogicalResourceId']} ({event['ResourceType']})", "resource", start, timestamp,
+                          lane=f"resources: {event['StackName']}", stack=event['StackName'], status=status)
+
+    def spans(self, category):
+        with self._lock:
+            return [e for e in self._events if e["cat"] == category]
+
+    def export(self, path):
+        """Write all spans as a Chrome/Perfetto trace JSON file."""
+        with self._lock:
+            events = list(self._events)
+            lanes = dict(self._lanes)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": label}}
+                    for label, tid in lanes.items()]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        logger.info(f"Trace written to {path}")
+
+    def critical_path(self, graph):
+        """Walk back from the last stack to finish through its latest-finishing dependency.
+
+        graph maps a stack name to the stack names it had to wait for. Returns
+        the chain of stack spans, first to last.
+        """
+        stacks = {e["name"]: e for e in self.spans("stack")}
+        if not stacks:
+            return []
+        current = max(stacks.values(), key=lambda e: e["ts"] + e["dur"])
+        path = [current]
+        while True:
+            deps = [stacks[d] for d in graph.get(current["name"], ()) if d in stacks]
+            if not deps:
+                break
+            current = max(deps, key=lambda e: e["ts"] + e["dur"])
+            path.append(current)
+        return list(reversed(path))
+
+    def log_summary(self, graph):
+        """Log wall time, the critical path and the slowest resources of the run."""
+        path = self.critical_path(graph)
+        if path:
+            start = path[0]["ts"]
+            end = path[-1]["ts"] + path[-1]["dur"]
+            logger.info(f"--- Critical path ({(end - start) / 1e6:.1f}s) ---")
+            for e in path:
+                logger.info(f"  {e['name']:<32} {e['dur'] / 1e6:8.1f}s  (started at +{(e['ts'] - start) / 1e6:.1f}s)")
+
+        resources = sorted(self.spans("resource"), key=lambda e: e["dur"], reverse=True)[:SLOWEST_RESOURCES]
+        if resources:
+            logger.info("--- Slowest resources ---")
+            for e in resources:
+                logger.info(f"  {e['args']['stack']:<24} {e['name']:<56} {e['dur'] / 1e6:8.1f}s")
+
+
+# --- Process-wide tracer ---
+tracer = Tracer()
@@ -1,11 +1,16 @@
-import boto3
+import argparse
 import logging
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
 from botocore.exceptions import ClientError
+from aws_clients import configure, get_client
+from api_metrics import api_metrics
 import os
 
 # Configure logging
@@ -19,59 +24,169 @@ CERT_DIR = SCRIPT_DIR  # Store certs in ca-cert directory where script is
 CERT_FILE = os.path.join(CERT_DIR, "alb.crt")
 KEY_FILE = os.path.join(CERT_DIR, "alb.key")
 
-def generate_self_signed_cert(cert_path, key_path, days_valid=365):
-    logger.info("Generating private key and self-signed certificate...")
+# --- Constants ---
+COMMON_NAME = "internal.saas.local"
+DEFAULT_DAYS_VALID = 365
+DEFAULT_RENEWAL_DAYS = 30
+KEY_TYPES = ("rsa", "ecdsa")
+DEFAULT_KEY_TYPE = "rsa"
+TENANT_CERT_DIR = os.path.join(CERT_DIR, "tenant-certs")
+DEFAULT_MAX_UPLOADS = 4
+FINGERPRINT_TAG = "lz:cert-fingerprint"
+# list_certificates only returns RSA-2048 certificates unless other key types are requested
+LISTED_KEY_TYPES = ["RSA_1024", "RSA_2048", "RSA_3072", "RSA_4096", "EC_prime256v1", "EC_secp384r1", "EC_secp521r1"]
 
-    key = rsa.generate_private_key(
+def generate_private_key(key_type=DEFAULT_KEY_TYPE):
+    """Generate an RSA-2048 or ECDSA P-256 private key."""
+    if key_type == "ecdsa":
+        return ec.generate_private_key(ec.SECP256R1())
+    return rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048,
     )
 
+def build_self_signed_cert(key, common_name=COMMON_NAME, alt_names=(), days_valid=DEFAULT_DAYS_VALID):
+    """Return (certificate PEM, private key PEM) of a self-signed certificate for common_name."""
     subject = issuer = x509.Name([
         x509.NameAttribute(NameOID.COUNTRY_NAME, "PH"),
         x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "Metro Manila"),
         x509.NameAttribute(NameOID.LOCALITY_NAME, "Taguig"),
         x509.NameAttribute(NameOID.ORGANIZATION_NAME, "SaaS"),
         x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, "Cloud"),
-        x509.NameAttribute(NameOID.COMMON_NAME, "internal.saas.local"),
+        x509.NameAttribute(NameOID.COMMON_NAME, common_name),
     ])
 
-    cert = x509.CertificateBuilder() \
+    builder = x509.CertificateBuilder() \
         .subject_name(subject) \
         .issuer_name(issuer) \
         .public_key(key.public_key()) \
         .serial_number(x509.random_serial_number()) \
         .not_valid_before(datetime.now(timezone.utc)) \
         .not_valid_after(datetime.now(timezone.utc) + timedelta(days=days_valid)) \
-        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True) \
-        .sign(key, hashes.SHA256())
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+    if alt_names:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(name) for name in alt_names]), critical=False)
+    cert = builder.sign(key, hashes.SHA256())
+
+    key_pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+def generate_self_signed_cert(cert_path, key_path, days_valid=DEFAULT_DAYS_VALID, key_type=DEFAULT_KEY_TYPE):
+    logger.info("Generating private key and self-signed certificate...")
+
+    cert_pem, key_pem = build_self_signed_cert(generate_private_key(key_type), days_valid=days_valid)
 
     with open(cert_path, "wb") as f:
-        f.write(cert.public_bytes(serialization.Encoding.PEM))
+        f.write(cert_pem)
     logger.info(f"Certificate saved to: {cert_path}")
 
     with open(key_path, "wb") as f:
-        f.write(key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption()
-        ))
+        f.write(key_pem)
     logger.info(f"Private key saved to: {key_path}")
 
-def upload_cert_to_acm(cert_path, key_path):
-    acm = boto3.client("acm")
+def load_local_cert(cert_path, key_path):
+    """Return the certificate stored at cert_path, or None if it or its key is missing."""
+    if not (os.path.isfile(cert_path) and os.path.isfile(key_path)):
+        return None
+    try:
+        with open(cert_path, "rb") as f:
+            return x509.load_pem_x509_certificate(f.read())
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable certificate {cert_path}: {e}")
+        return None
+
+def needs_renewal(cert, renewal_days=DEFAULT_RENEWAL_DAYS):
+    """True when the certificate expires within the renewal window."""
+    return cert.not_valid_after_utc - datetime.now(timezone.utc) < timedelta(days=renewal_days)
+
+def cert_fingerprint(cert):
+    """SHA-256 fingerprint of a certificate, as hex."""
+    return cert.fingerprint(hashes.SHA256()).hex()
+
+def cert_key_type(cert):
+    """Return "ecdsa" or "rsa" depending on the certificate's public key."""
+    return "ecdsa" if isinstance(cert.public_key(), ec.EllipticCurvePublicKey) else "rsa"
+
+def cert_matches(cert, hostnames, key_type=DEFAULT_KEY_TYPE):
+    """True when the certificate covers exactly these hostnames with the requested key type."""
+    try:
+        alt_names = set(cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+                        .get_values_for_type(x509.DNSName))
+    except x509.ExtensionNotFound:
+        alt_names = set()
+    return alt_names == set(hostnames) and cert_key_type(cert) == key_type
+
+def list_imported_certificates(acm):
+    """Map domain names to the ARNs of imported ACM certificates, in one paginated sweep."""
+    by_domain = {}
+    paginator = acm.get_paginator('list_certificates')
+    for page in paginator.paginate(Includes={"keyTypes": LISTED_KEY_TYPES}):
+        for summary in page['CertificateSummaryList']:
+            if summary.get('Type', 'IMPORTED') == 'IMPORTED':
+                by_domain.setdefault(summary.get('DomainName'), []).append(summary['CertificateArn'])
+    return by_domain
+
+def match_certificate(acm, arns, fingerprint):
+    """Pick the certificate this script manages among arns, using its fingerprint tag.
+
+    Returns (arn, tagged fingerprint), preferring an exact fingerprint match,
+    or (None, None).
+    """
+    managed = (None, None)
+    for arn in arns:
+        tags = acm.list_tags_for_certificate(CertificateArn=arn).get('Tags', [])
+        tagged = next((t.get('Value') for t in tags if t['Key'] == FINGERPRINT_TAG), None)
+        if tagged and tagged == fingerprint:
+            return arn, tagged
+        if tagged and managed[0] is None:
+            managed = (arn, tagged)
+    return managed
+
+def acm_certificate_reusable(acm, arn, renewal_days=DEFAULT_RENEWAL_DAYS, key_type=DEFAULT_KEY_TYPE):
+    """True when an ACM certificate has the requested key type and is outside the renewal window."""
+    cert = acm.describe_certificate(CertificateArn=arn)['Certificate']
+    acm_key_type = "ecdsa" if cert.get('KeyAlgorithm', 'RSA_2048').startswith("EC") else "rsa"
+    not_after = cert.get('NotAfter')
+    return (acm_key_type == key_type and not_after is not None
+            and not_after - datetime.now(timezone.utc) >= timedelta(days=renewal_days))
+
+def find_acm_certificate(acm, domain_name, fingerprint):
+    """Find the certificate this script manages for domain_name in ACM."""
+    return match_certificate(acm, list_imported_certificates(acm).get(domain_name, []), fingerprint)
+
+def upload_cert_to_acm(cert_path, key_path, certificate_arn=None, acm=None):
+    """Import the certificate into ACM, reimporting into certificate_arn when given.
+
+    The certificate is tagged with its fingerprint so later runs can find it.
+    Returns the certificate ARN, or None on failure.
+    """
+    acm = acm or get_client("acm")
 
     with open(cert_path, "rb") as f:
         cert_body = f.read()
     with open(key_path, "rb") as f:
         private_key = f.read()
-
-    logger.info("Uploading certificate to ACM...")
+    tag = {"Key": FINGERPRINT_TAG, "Value": cert_fingerprint(x509.load_pem_x509_certificate(cert_body))}
 
     try:
+        if certificate_arn:
+            logger.info(f"Reimporting certificate into {certificate_arn}...")
+            # Tags cannot be passed when reimporting
+            acm.import_certificate(CertificateArn=certificate_arn, Certificate=cert_body, PrivateKey=private_key)
+            acm.add_tags_to_certificate(CertificateArn=certificate_arn, Tags=[tag])
+            logger.info(f"Certificate successfully reimported to ACM: {certificate_arn}")
+            return certificate_arn
+
+        logger.info("Uploading certificate to ACM...")
         response = acm.import_certificate(
             Certificate=cert_body,
-            PrivateKey=private_key
+            PrivateKey=private_key,
+            Tags=[tag]
         )
         logger.info(f"Certificate successfully uploaded to ACM: {response['CertificateArn']}")
         return response['CertificateArn']
@@ -79,6 +194,162 @@ def upload_cert_to_acm(cert_path, key_path):
         logger.error(f"Failed to upload certificate: {e}")
         return None
 
+def ensure_certificate(cert_path=CERT_FILE, key_path=KEY_FILE, renewal_days=DEFAULT_RENEWAL_DAYS,
+                       days_valid=DEFAULT_DAYS_VALID, acm=None, key_type=DEFAULT_KEY_TYPE):
+    """Return the ACM ARN of a valid ALB certificate, generating and uploading only when needed.
+
+    The local certificate is reused until it enters the renewal window. It is
+    uploaded only if ACM does not hold it yet, into the ARN of the previous
+    certificate when there is one. Without a local certificate (e.g. a fresh
+    CI checkout), the managed certificate already in ACM is reused while it
+    is outside the renewal window. Returns None on failure.
+    """
+    acm = acm or get_client("acm")
+
+    cert = load_local_cert(cert_path, key_path)
+    if cert is None:
+        try:
+            arn, _ = find_acm_certificate(acm, COMMON_NAME, None)
+            if arn and acm_certificate_reusable(acm, arn, renewal_days, key_type):
+                logger.info(f"No local certificate; reusing the certificate already in ACM: {arn}")
+                return arn
+        except ClientError as e:
+            logger.error(f"Failed to look up certificates in ACM: {e}")
+            return None
+
+    if cert is None or needs_renewal(cert, renewal_days) or cert_key_type(cert) != key_type:
+        generate_self_signed_cert(cert_path, key_path, days_valid, key_type)
+        cert = load_local_cert(cert_path, key_path)
+    else:
+        logger.info(f"Reusing local certificate valid until {cert.not_valid_after_utc:%Y-%m-%d}")
+
+    fingerprint = cert_fingerprint(cert)
+    try:
+        arn, tagged = find_acm_certificate(acm, COMMON_NAME, fingerprint)
+    except ClientError as e:
+        logger.error(f"Failed to look up certificates in ACM: {e}")
+        return None
+
+    if arn and tagged == fingerprint:
+        logger.info(f"Certificate already in ACM: {arn}")
+        return arn
+    return upload_cert_to_acm(cert_path, key_path, certificate_arn=arn, acm=acm)
+
+def tenant_hostnames(tenant):
+    """Hostnames of a tenant's certificate; the first one is its common name."""
+    return tenant.get("hostnames") or [f"{tenant['name']}.{COMMON_NAME}"]
+
+def mint_certificate(job):
+    """Generate one tenant key and certificate. Runs in a worker process."""
+    name, hostnames, key_type, days_valid = job
+    cert_pem, key_pem = build_self_signed_cert(generate_private_key(key_type), hostnames[0], hostnames, days_valid)
+    return name, cert_pem, key_pem
+
+def mint_tenant_certificates(jobs, max_processes=None):
+    """Mint certificates for (name, hostnames, key_type, days_valid) jobs across a process pool.
+
+    Returns a dict of tenant name to (certificate PEM, private key PEM).
+    """
+    workers = max_processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        minted = pool.map(mint_certificate, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        return {name: (cert_pem, key_pem) for name, cert_pem, key_pem in minted}
+
+def ensure_tenant_certificates(tenants, out_dir=TENANT_CERT_DIR, key_type=DEFAULT_KEY_TYPE,
+                               renewal_days=DEFAULT_RENEWAL_DAYS, days_valid=DEFAULT_DAYS_VALID,
+                               max_processes=None, max_uploads=DEFAULT_MAX_UPLOADS, acm=None):
+    """Make sure every tenant has a valid certificate in ACM and return {tenant name: ARN or None}.
+
+    Local certificates in out_dir are reused until they enter the renewal
+    window; missing, expiring or changed ones are minted on a process pool.
+    ACM is listed once for the whole batch and at most max_uploads
+    certificates are looked up or imported at the same time.
+    """
+    acm = acm or get_client("acm")
+    os.makedirs(out_dir, exist_ok=True)
+    hostnames = {t["name"]: tenant_hostnames(t) for t in tenants}
+    paths = {name: (os.path.join(out_dir, f"{name}.crt"), os.path.join(out_dir, f"{name}.key")) for name in hostnames}
+
+    jobs = []
+    for name, (cert_path, key_path) in paths.items():
+        cert = load_local_cert(cert_path, key_path)
+        if cert is None or needs_renewal(cert, renewal_days) or not cert_matches(cert, hostnames[name], key_type):
+            jobs.append((name, hostnames[name], key_type, days_valid))
+    logger.info(f"Reusing {len(paths) - len(jobs)} local certificate(s); minting {len(jobs)} {key_type.upper()} certificate(s).")
+    if jobs:
+        for name, (cert_pem, key_pem) in mint_tenant_certificates(jobs, max_processes).items():
+            cert_path, key_path = paths[name]
+            with open(cert_path, "wb") as f:
+                f.write(cert_pem)
+            with open(key_path, "wb") as f:
+                f.write(key_pem)
+
+    try:
+        by_domain = list_imported_certificates(acm)
+    except ClientError as e:
+        logger.error(f"Failed to look up certificates in ACM: {e}")
+        return {name: None for name in paths}
+
+    def ensure(name):
+        cert_path, key_path = paths[name]
+        fingerprint = cert_fingerprint(load_local_cert(cert_path, key_path))
+        try:
+            arn, tagged = match_certificate(acm, by_domain.get(hostnames[name][0], []), fingerprint)
+        except ClientError as e:
+            logger.error(f"Failed to look up the certificate of tenant {name}: {e}")
+            return None
+        if arn and tagged == fingerprint:
+            return arn
+        return upload_cert_to_acm(cert_path, key_path, certificate_arn=arn, acm=acm)
+
+    with ThreadPoolExecutor(max_workers=max_uploads) as pool:
+        arns = dict(zip(paths, pool.map(ensure, paths)))
+
+    failed = [name for name, arn in arns.items() if not arn]
+    logger.info(f"{len(arns) - len(failed)}/{len(arns)} tenant certificate(s) in ACM.")
+    if failed:
+        logger.error(f"Tenants without a certificate: {', '.join(failed)}")
+    return arns
+
 if __name__ == "__main__":
-    generate_self_signed_cert(CERT_FILE, KEY_FILE)
-    upload_cert_to_acm(CERT_FILE, KEY_FILE)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--renewal-days', type=int, default=DEFAULT_RENEWAL_DAYS,
+                        help='Rotate the certificate when it expires within this many days.')
+    parser.add_argument('--days-valid', type=int, default=DEFAULT_DAYS_VALID,
+                        help='Validity of a newly generated certificate, in days.')
+    parser.add_argument('--key-type', choices=KEY_TYPES, default=DEFAULT_KEY_TYPE,
+                        help='Private key type; ECDSA P-256 keys are much cheaper to generate than RSA-2048.')
+    parser.add_argument('--tenants', metavar='MANIFEST',
+                        help='JSON list of {name, hostnames} objects; mints and imports one certificate per tenant.')
+    parser.add_argument('--out-dir', default=TENANT_CERT_DIR, help='Directory for tenant certificates (with --tenants).')
+    parser.add_argument('--max-processes', type=int, help='Processes used to generate keys (defaults to the CPU count).')
+    parser.add_argument('--max-uploads', type=int, default=DEFAULT_MAX_UPLOADS,
+                        help='Maximum number of concurrent ACM lookups and imports (with --tenants).')
+    parser.add_argument('--region', help='AWS region (defaults to the configured region).')
+    parser.add_argument('--profile', help='AWS profile (defaults to the configured credentials).')
+    parser.add_argument('--arn-map', metavar='PATH', help='Write the tenant to certificate ARN map to this JSON file.')
+    parser.add_argument('--metrics-file', help='Write per-operation AWS API call metrics as an OpenMetrics text file.')
+    args = parser.parse_args()
+    configure(args.region, args.profile, args.max_uploads)
+
+    try:
+        if args.tenants:
+            with open(args.tenants, 'r') as f:
+                tenants = json.load(f)
+            arns = ensure_tenant_certificates(tenants, args.out_dir, args.key_type, args.renewal_days,
+                                              args.days_valid, args.max_processes, args.max_uploads)
+            if args.arn_map:
+                with open(args.arn_map, 'w') as f:
+                    json.dump(arns, f, indent=2, sort_keys=True)
+                logger.info(f"Tenant certificate ARNs written to {args.arn_map}")
+            else:
+                print(json.dumps(arns, indent=2, sort_keys=True))
+            if not all(arns.values()):
+                sys.exit(1)
+        elif not ensure_certificate(CERT_FILE, KEY_FILE, args.renewal_days, args.days_valid,
+                                    key_type=args.key_type):
+            sys.exit(1)
+    finally:
+        api_metrics.log_summary()
+        if args.metrics_file:
+            api_metrics.export(args.metrics_file, "upload_cert_to_acm")
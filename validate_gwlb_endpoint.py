@@ -1,52 +1,137 @@
-import boto3
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from aws_clients import configure, get_client
+from scheduler import DEFAULT_MAX_WORKERS
 
-# -------- Configuration --------
-region = "ap-southeast-1"
-spoke_vpc_id = None  # Set your spoke VPC ID, or leave None to check all VPCs
+# --- Logging setup ---
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
 
-# -------- Initialize Boto3 Client --------
-ec2 = boto3.client("ec2", region_name=region)
+# --- Constants ---
+GWLB_ENDPOINT_FILTER = {"Name": "vpc-endpoint-type", "Values": ["GatewayLoadBalancer"]}
 
-# -------- Retrieve GWLBe Endpoints --------
-filters = [{"Name": "vpc-endpoint-type", "Values": ["GatewayLoadBalancer"]}]
-if spoke_vpc_id:
-    filters.append({"Name": "vpc-id", "Values": [spoke_vpc_id]})
 
-print("Retrieving Gateway Load Balancer Endpoints...")
-response = ec2.describe_vpc_endpoints(Filters=filters)
-endpoints = response.get("VpcEndpoints", [])
+def describe_gwlb_endpoints(ec2, vpc_id=None, endpoint_ids=None):
+    """Return GWLB endpoints, optionally scoped to one VPC and/or specific endpoint IDs."""
+    filters = [GWLB_ENDPOINT_FILTER]
+    if vpc_id:
+        filters.append({"Name": "vpc-id", "Values": [vpc_id]})
+    kwargs = {"Filters": filters}
+    if endpoint_ids:
+        kwargs["VpcEndpointIds"] = list(endpoint_ids)
 
-if not endpoints:
-    print("No GWLBe endpoints found.")
-    exit(1)
+    endpoints = []
+    for page in ec2.get_paginator('describe_vpc_endpoints').paginate(**kwargs):
+        endpoints.extend(page.get("VpcEndpoints", []))
+    return endpoints
 
-# Fetch all service details
-services_response = ec2.describe_vpc_endpoint_services()
-service_details = services_response["ServiceDetails"]
 
-for ep in endpoints:
+def describe_endpoint_services(ec2, service_names):
+    """Return service details for the given service names, indexed by ServiceId."""
+    services = {}
+    if not service_names:
+        return services
+    paginator = ec2.get_paginator('describe_vpc_endpoint_services')
+    try:
+        for page in paginator.paginate(ServiceNames=sorted(service_names)):
+            for service in page.get("ServiceDetails", []):
+                services[service["ServiceId"]] = service
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'InvalidServiceName':
+            raise
+        if len(service_names) == 1:
+            return services
+        # One of the names is not visible to this account; look them up individually
+        for name in service_names:
+            services.update(describe_endpoint_services(ec2, {name}))
+    return services
+
+
+def check_endpoint(ep, services):
+    """Log one endpoint's details and return a list of problems found."""
+    problems = []
     ep_id = ep["VpcEndpointId"]
     service_name = ep["ServiceName"]
-    subnet_ids = ep["SubnetIds"]
-    vpc_id = ep["VpcId"]
 
-    print(f"\nGWLBe ID: {ep_id}")
-    print(f"  VPC ID: {vpc_id}")
-    print(f"  Subnets: {', '.join(subnet_ids)}")
-    print(f"  Service Name: {service_name}")
+    logger.info(f"GWLBe ID: {ep_id}")
+    logger.info(f"  VPC ID: {ep['VpcId']}")
+    logger.info(f"  Subnets: {', '.join(ep.get('SubnetIds', []))}")
+    logger.info(f"  Service Name: {service_name}")
+    logger.info(f"  State: {ep.get('State')}")
 
-    # Extract service ID from service name
-    service_id = service_name.split(".")[-1]
+    if ep.get("State", "").lower() != "available":
+        problems.append(f"{ep_id} is in state {ep.get('State')}")
 
-    # Match service detail
-    matched_service = next((s for s in service_details if s["ServiceId"] == service_id), None)
-
-    if matched_service:
-        print(f"  Service ID: {matched_service['ServiceId']}")
-        print(f"  Service Owner: {matched_service['Owner']}")
-        print(f"  Acceptance Required: {matched_service['AcceptanceRequired']}")
-        print(f"  Service Type: {matched_service['ServiceType'][0]['ServiceType']}")
+    # Service ID is the last component of the service name
+    service = services.get(service_name.split(".")[-1])
+    if service:
+        logger.info(f"  Service ID: {service['ServiceId']}")
+        logger.info(f"  Service Owner: {service['Owner']}")
+        logger.info(f"  Acceptance Required: {service['AcceptanceRequired']}")
+        logger.info(f"  Service Type: {service['ServiceType'][0]['ServiceType']}")
     else:
-        print("  Warning: Service details not found. The service may not be shared with this account.")
+        logger.warning("  Service details not found. The service may not be shared with this account.")
+
+    return problems
+
+
+def validate_gwlb_endpoints(ec2, endpoints_by_vpc=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Validate GWLB endpoints and their endpoint services.
+
+    endpoints_by_vpc maps a VPC ID to the endpoint IDs expected in it (or None
+    for every GWLB endpoint in that VPC); VPCs are described concurrently.
+    Without it, every GWLB endpoint in the region is checked. Returns True when
+    all expected endpoints exist and are available.
+    """
+    logger.info("Retrieving Gateway Load Balancer Endpoints...")
+    problems = []
+    try:
+        if endpoints_by_vpc:
+            items = list(endpoints_by_vpc.items())
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                per_vpc = pool.map(lambda item: describe_gwlb_endpoints(ec2, item[0], item[1]), items)
+            endpoints = [ep for vpc_endpoints in per_vpc for ep in vpc_endpoints]
+
+            found = {ep["VpcEndpointId"] for ep in endpoints}
+            for vpc_id, endpoint_ids in items:
+                for ep_id in endpoint_ids or []:
+                    if ep_id not in found:
+                        problems.append(f"{ep_id} not found in VPC {vpc_id}")
+        else:
+            endpoints = describe_gwlb_endpoints(ec2)
+
+        if not endpoints:
+            logger.error("No GWLBe endpoints found.")
+            return False
+
+        services = describe_endpoint_services(ec2, {ep["ServiceName"] for ep in endpoints})
+    except ClientError as e:
+        logger.error(f"Failed to describe GWLB endpoints: {e}")
+        return False
+
+    for ep in endpoints:
+        problems.extend(check_endpoint(ep, services))
+
+    for problem in problems:
+        logger.error(f"GWLB endpoint check failed: {problem}")
+    logger.info("Validation complete.")
+    return not problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--region', help='AWS region (defaults to the configured region).')
+    parser.add_argument('--profile', help='AWS profile (defaults to the configured credentials).')
+    parser.add_argument('--vpc-id', help='Spoke VPC ID; checks every VPC when omitted.')
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='Maximum number of VPCs checked concurrently.')
+    args = parser.parse_args()
 
-print("\nValidation complete.")
+    configure(args.region, args.profile, args.max_workers)
+    ec2 = get_client("ec2")
+    endpoints_by_vpc = {args.vpc_id: None} if args.vpc_id else None
+    if not validate_gwlb_endpoints(ec2, endpoints_by_vpc, args.max_workers):
+        sys.exit(1)